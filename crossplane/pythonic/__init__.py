@@ -1,7 +1,7 @@
 
 
 from .composite import BaseComposite
-from .protobuf import append, Map, List, Unknown, Yaml, YamlAll, Json, B64Encode, B64Decode
+from .protobuf import append, Map, List, Unknown, Yaml, YamlAll, Json, B64Encode, B64Decode, Path, Query
 
 __all__ = [
     'BaseComposite',
@@ -14,4 +14,6 @@ __all__ = [
     'Json',
     'B64Encode',
     'B64Decode',
+    'Path',
+    'Query',
 ]
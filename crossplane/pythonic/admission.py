@@ -0,0 +1,70 @@
+
+import asyncio
+import collections
+import time
+
+
+class Admission:
+    """Limits the number of RunFunction requests being processed at once.
+
+    Requests past the in flight limit wait, first in first out, in a bounded
+    queue. Requests past the queue limit, or that wait longer than the queue
+    timeout, are not admitted so they can be shed quickly.
+    """
+
+    def __init__(self, max_in_flight, max_queued=0, queue_timeout=None):
+        self.max_in_flight = max_in_flight
+        self.max_queued = max_queued
+        self.queue_timeout = queue_timeout
+        self.in_flight = 0
+        self.admitted = 0
+        self.rejected = 0
+        self.waited = 0
+        self.wait_seconds = 0.0
+        self._waiters = collections.deque()
+
+    @property
+    def queued(self):
+        return len(self._waiters)
+
+    async def acquire(self):
+        if self.in_flight < self.max_in_flight and not self._waiters:
+            self.in_flight += 1
+            self.admitted += 1
+            return True
+        if len(self._waiters) >= self.max_queued:
+            self.rejected += 1
+            return False
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        start = time.monotonic()
+        admitted = False
+        try:
+            # release() hands its in flight slot directly to the waiter
+            await asyncio.wait_for(waiter, self.queue_timeout)
+            admitted = True
+        except asyncio.TimeoutError:
+            self.rejected += 1
+            return False
+        finally:
+            if not admitted:
+                if waiter.done() and not waiter.cancelled():
+                    # The slot was handed over after the wait timed out or was cancelled
+                    self.release()
+                else:
+                    try:
+                        self._waiters.remove(waiter)
+                    except ValueError:
+                        pass
+            self.waited += 1
+            self.wait_seconds += time.monotonic() - start
+        self.admitted += 1
+        return True
+
+    def release(self):
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.in_flight -= 1
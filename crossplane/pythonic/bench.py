@@ -0,0 +1,148 @@
+
+import asyncio
+import collections
+import pathlib
+import sys
+import time
+
+import crossplane.function.proto.v1.run_function_pb2_grpc as grpcv1
+import grpc
+from crossplane.function.proto.v1 import run_function_pb2 as fnv1
+
+from . import (
+    command,
+    replay,
+    synthetic,
+)
+
+
+class Command(command.Command):
+    name = 'bench'
+    help = 'Benchmark a running function-pythonic gRPC server'
+
+    @classmethod
+    def add_parser_arguments(cls, parser):
+        parser.add_argument(
+            '--address',
+            default='localhost:9443',
+            help='Address of the insecure gRPC server, use unix:PATH for a Unix socket, default: localhost:9443',
+        )
+        parser.add_argument(
+            '--records',
+            type=pathlib.Path,
+            action='append',
+            default=[],
+            metavar='PATH',
+            help='Send the requests recorded using the grpc command --record-dir option, default sends synthetic requests.',
+        )
+        parser.add_argument(
+            '--resources',
+            type=int,
+            default=10,
+            metavar='RESOURCES',
+            help='Number of resources composed by synthetic requests, default 10.',
+        )
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=8,
+            metavar='REQUESTS',
+            help='Number of concurrent requests, default 8.',
+        )
+        parser.add_argument(
+            '--rate',
+            type=float,
+            default=0,
+            metavar='RATE',
+            help='Requests per second to send, default 0 sends as fast as --concurrency allows.',
+        )
+        parser.add_argument(
+            '--duration',
+            type=float,
+            default=10,
+            metavar='SECONDS',
+            help='Number of seconds to run the benchmark, default 10.',
+        )
+        parser.add_argument(
+            '--warmup',
+            type=int,
+            default=10,
+            metavar='REQUESTS',
+            help='Number of requests to send before starting the benchmark, default 10.',
+        )
+        parser.add_argument(
+            '--server-pid',
+            type=int,
+            metavar='PID',
+            help='Process id of the server, to report its memory growth.',
+        )
+
+    async def run(self):
+        if self.args.records:
+            requests = []
+            for path in self.args.records:
+                requests.extend(request for request, response in replay.read_records(path))
+            if not requests:
+                print('No recorded requests found', file=sys.stderr)
+                sys.exit(1)
+        else:
+            requests = [synthetic.request(self.args.resources)]
+
+        async with grpc.aio.insecure_channel(self.args.address) as channel:
+            stub = grpcv1.FunctionRunnerServiceStub(channel)
+            for ix in range(self.args.warmup):
+                await stub.RunFunction(requests[ix % len(requests)])
+
+            rss_start = rss(self.args.server_pid)
+            rss_peak = rss_start
+            latencies = []
+            errors = collections.Counter()
+            count = 0
+            start = time.perf_counter()
+            end = start + self.args.duration
+
+            async def send():
+                nonlocal count, rss_peak
+                while True:
+                    ix = count
+                    count += 1
+                    if self.args.rate > 0:
+                        delay = start + ix / self.args.rate - time.perf_counter()
+                        if delay > 0:
+                            await asyncio.sleep(delay)
+                    if time.perf_counter() >= end:
+                        return
+                    request_start = time.perf_counter()
+                    try:
+                        response = await stub.RunFunction(requests[ix % len(requests)])
+                    except grpc.aio.AioRpcError as e:
+                        errors[e.code().name] += 1
+                    else:
+                        if any(result.severity == fnv1.SEVERITY_FATAL for result in response.results):
+                            errors['FATAL'] += 1
+                    latencies.append(time.perf_counter() - request_start)
+                    if ix % 100 == 0:
+                        rss_peak = max(rss_peak, rss(self.args.server_pid))
+
+            await asyncio.gather(*[send() for _ in range(self.args.concurrency)])
+            elapsed = time.perf_counter() - start
+
+        print(f"Requests:    {len(latencies)}")
+        print(f"Errors:      {sum(errors.values())}{''.join(f', {code}: {count}' for code, count in sorted(errors.items()))}")
+        replay.print_latencies(latencies, elapsed)
+        if self.args.server_pid:
+            rss_end = rss(self.args.server_pid)
+            print(f"Server RSS:  {rss_start / 1024:.1f}MB start, {max(rss_peak, rss_end) / 1024:.1f}MB peak, {rss_end / 1024:.1f}MB end, {(rss_end - rss_start) / 1024:+.1f}MB growth")
+
+
+def rss(pid):
+    """The resident set size, in kilobytes, of the process."""
+    if not pid:
+        return 0
+    try:
+        for line in pathlib.Path(f"/proc/{pid}/status").read_text().splitlines():
+            if line.startswith('VmRSS:'):
+                return int(line.split()[1])
+    except OSError:
+        pass
+    return 0
@@ -99,9 +99,11 @@ class BaseComposite:
                     seconds=60,
                 ),
             ),
-            desired=request.desired,
-            context=request.context,
         )
+        # Protobuf cannot move submessages between messages, CopyFrom is the fastest copy
+        # of what are often the largest parts of the request.
+        response.desired.CopyFrom(request.desired)
+        response.context.CopyFrom(request.context)
         self.response = protobuf.Message(None, 'response', response.DESCRIPTOR, response)
         self.logger = logger
         self.capabilities = Capabilities(self.request.meta.capabilities)
@@ -565,6 +567,11 @@ class RequiredResources:
         for ix in range(len(self)):
             yield self[ix]
 
+    def _observedRaw(self):
+        # The observed protobuf of each resource, queries use it instead of creating a RequiredResource for each
+        items = self._resources.items._messages
+        return [] if items is protobuf._Unknown else [item.resource for item in items]
+
 
 class RequiredResource:
     def __init__(self, name, ix, resource):
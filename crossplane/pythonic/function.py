@@ -1,6 +1,8 @@
 """A Crossplane composition function."""
 
 import asyncio
+import contextlib
+import hashlib
 import importlib
 import inspect
 import logging
@@ -10,6 +12,11 @@ import grpc
 from crossplane.function.proto.v1 import run_function_pb2 as fnv1
 from crossplane.function.proto.v1 import run_function_pb2_grpc as grpcv1
 from .. import pythonic
+from . import (
+    cache,
+    metrics,
+    protobuf,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -17,11 +24,20 @@ logger = logging.getLogger(__name__)
 class FunctionRunner(grpcv1.FunctionRunnerService):
     """A FunctionRunner handles gRPC RunFunctionRequests."""
 
-    def __init__(self, renderUnknowns=False, crossplane_v1=False):
+    def __init__(self, renderUnknowns=False, crossplane_v1=False, cache_size=256):
         """Create a new FunctionRunner."""
         self.renderUnknowns = renderUnknowns
         self.crossplane_v1 = crossplane_v1
-        self.clazzes = {}
+        # Composite classes keyed by the digest of the inline script or module class name
+        self.clazzes = cache.LRUCache(cache_size)
+        # Set to a workers.ComposePool to run compose in worker processes
+        self.compose_pool = None
+        # Set to an admission.Admission to bound the number of requests processed at once
+        self.admission = None
+        # Set to a profiler.Profiler to profile compose() calls
+        self.profiler = None
+        # Set to a replay.Recorder to record requests and responses
+        self.recorder = None
 
     def invalidate_module(self, module):
         ix = len(module)
@@ -32,16 +48,48 @@ class FunctionRunner(grpcv1.FunctionRunnerService):
             ix = module.rfind('.')
         importlib.invalidate_caches()
         self.clazzes.clear()
+        if self.compose_pool:
+            self.compose_pool.invalidate()
 
     async def RunFunction(
-        self, request: fnv1.RunFunctionRequest, _: grpc.aio.ServicerContext
+        self, request: fnv1.RunFunctionRequest, context: grpc.aio.ServicerContext
     ) -> fnv1.RunFunctionResponse:
+        if self.admission:
+            if not await self.admission.acquire():
+                message = f"Overloaded, {self.admission.in_flight} in flight and {self.admission.queued} queued"
+                logger.warning(message)
+                if context is None:
+                    return self.fatal(request, logger, message)
+                await context.abort(grpc.StatusCode.RESOURCE_EXHAUSTED, message)
+            try:
+                response = await self.run_function_safe(request)
+            finally:
+                self.admission.release()
+        else:
+            response = await self.run_function_safe(request)
+        if self.recorder:
+            self.recorder.record(request, response)
+        return response
+
+    async def run_function_safe(self, request):
         try:
+            if self.compose_pool:
+                return await self.compose_pool.run_function(request)
             return await self.run_function(request)
         except Exception as e:
             return self.fatal(request, logger, 'RunFunction', e)
 
     async def run_function(self, request):
+        phases = metrics.Phases()
+        try:
+            return await self.run_phases(request, phases)
+        finally:
+            self.observe(phases.composite, phases.step, phases.result, phases.phases)
+
+    def observe(self, composite, step, result, phases):
+        metrics.observe(composite, step, result, phases)
+
+    async def run_phases(self, request, phases):
         composite = request.observed.composite.resource
         name = list(reversed(composite['apiVersion'].split('/')[0].split('.')))
         name.append(composite['kind'])
@@ -57,13 +105,17 @@ class FunctionRunner(grpcv1.FunctionRunnerService):
                 return self.fatal(request, logger, 'Missing input "composite"')
             composite = request.input['composite']
 
+        # Scripts can be many kilobytes, digest them once and use that for all lookups
+        digest = hashlib.blake2b(composite.encode('utf-8'), digest_size=16).hexdigest()
+
         # Ideally this is something the Function API provides
         if 'step' in request.input:
             step = request.input['step']
         else:
-            step = str(hash(composite))
+            step = digest
+        phases.step = step
 
-        clazz = self.clazzes.get(composite)
+        clazz = self.clazzes.get(digest)
         if not clazz:
             if '\n' in composite:
                 module = Module()
@@ -95,12 +147,15 @@ class FunctionRunner(grpcv1.FunctionRunnerService):
                     return self.fatal(request, logger, f"{composite} is not a class")
                 if not issubclass(clazz, pythonic.BaseComposite):
                     return self.fatal(request, logger, f"{composite} is not a subclass of BaseComposite")
-            self.clazzes[composite] = clazz
+            self.clazzes.put(digest, clazz)
+        phases.composite = clazz.__qualname__ if clazz.__module__ == 'builtins' else f"{clazz.__module__}.{clazz.__qualname__}"
+        phases.phase('resolve')
 
         try:
             composite = clazz(self.crossplane_v1, request, logger)
         except Exception as e:
             return self.fatal(request, logger, 'Instantiate', e)
+        phases.phase('init')
 
         step = composite.context._pythonic[step]
         iteration = int(step.iteration) + 1
@@ -115,26 +170,34 @@ class FunctionRunner(grpcv1.FunctionRunnerService):
             logger.debug(f"Starting compose, {ordinal(len(composite.context._pythonic))} step, {ordinal(iteration)} pass")
 
         try:
-            result = composite.compose()
-            if asyncio.iscoroutine(result):
-                await result
+            with self.profiler.profile(clazz, phases.composite) if self.profiler else contextlib.nullcontext():
+                result = composite.compose()
+                if asyncio.iscoroutine(result):
+                    await result
         except Exception as e:
             return self.fatal(request, logger, 'Compose', e)
+        phases.phase('compose')
 
         schemas = self.get_schemas(step, composite)
         requireds = self.get_requireds(step, composite)
+        phases.phase('requirements')
         if schemas or requireds:
             if schemas:
                 logger.debug(f"Required schemas: {','.join(schemas)}")
             if requireds:
                 logger.debug(f"Required resources: {','.join(requireds)}")
+            phases.result = 'requirements'
         else:
             self.process_usages(composite)
+            phases.phase('usages')
             self.process_unknowns(composite)
+            phases.phase('unknowns')
             # Perform auto ready on all resources.
             for name, resource in composite.resources:
                 resource.ready
+            phases.phase('auto_ready')
             logger.info('Completed compose')
+            phases.result = 'completed'
 
         return composite.response._message
 
@@ -192,37 +255,38 @@ class FunctionRunner(grpcv1.FunctionRunnerService):
         else:
             apiVersion = 'protection.crossplane.io/v1beta1'
         for _, resource in sorted(entry for entry in composite.resources):
-            dependencies = resource.desired._getDependencies
+            dependencies = resource.desired._getDependencyPaths
             if dependencies:
+                # Ordered by the destination full name
+                dependencies = sorted(dependencies.items(), key=lambda item: protobuf._formatPath(item[0]))
                 if composite.logger.isEnabledFor(logging.DEBUG):
-                    for destination, source in sorted(dependencies.items()):
-                        destination = self.trimFullName(destination)
-                        source = self.trimFullName(source)
+                    for destination, source in dependencies:
+                        destination = self.trimPath(destination)
+                        source = self.trimPath(source)
                         composite.logger.debug(f"Dependency: {destination} = {source}")
                 if resource.usages or (resource.usages is None and composite.usages):
                     resources = {}
                     requireds = {}
-                    for destination, source in sorted(dependencies.items()):
-                        name = source.split('.')
-                        if (len(name) > 5 and
-                            name[0] in ('request', 'response') and
-                            name[1] in ('observed', 'desired') and
-                            name[2] == 'resources' and
-                            name[4] == 'resource'
+                    for destination, source in dependencies:
+                        if (len(source) > 5 and
+                            source[0] in ('request', 'response') and
+                            source[1] in ('observed', 'desired') and
+                            source[2] == 'resources' and
+                            source[4] == 'resource'
                         ):
-                            if name[3] not in resources:
-                                resources[name[3]] = []
-                            resources[name[3]].append(f"{'.'.join(destination.split('.')[5:])} = {'.'.join(name[5:])}")
-                        elif (len(name) > 5 and
-                            name[0] == 'request' and
-                            name[1] in ('required_resources', 'extra_resources') and
-                            name[3].startswith('items[') and name[3][-1] == ']' and
-                            name[4] == 'resource'
+                            if source[3] not in resources:
+                                resources[source[3]] = []
+                            resources[source[3]].append(f"{protobuf._formatPath(destination[5:])} = {protobuf._formatPath(source[5:])}")
+                        elif (len(source) > 6 and
+                            source[0] == 'request' and
+                            source[1] in ('required_resources', 'extra_resources') and
+                            source[3] == 'items' and
+                            source[5] == 'resource'
                         ):
-                            key = (name[2], int(name[3][6:-1]))
+                            key = (source[2], source[4])
                             if key not in requireds:
                                 requireds[key] = []
-                            requireds[key].append(f"{'.'.join(destination.split('.')[5:])} = {'.'.join(name[5:])}")
+                            requireds[key].append(f"{protobuf._formatPath(destination[5:])} = {protobuf._formatPath(source[6:])}")
                     for name, dependencies in resources.items():
                         source = composite.resources[name]
                         name = [resource.name, str(source.kind)]
@@ -279,7 +343,7 @@ class FunctionRunner(grpcv1.FunctionRunnerService):
         warningResources = []
         fatalResources = []
         for name, resource in sorted(entry for entry in composite.resources):
-            unknowns = resource.desired._getUnknowns
+            unknowns = resource.desired._getUnknownPaths
             if unknowns:
                 unknownResources.append(name)
                 warning = False
@@ -291,9 +355,9 @@ class FunctionRunner(grpcv1.FunctionRunnerService):
                         fatalResources.append(name)
                         fatal = True
                 if composite.logger.isEnabledFor(logging.DEBUG):
-                    for destination, source in sorted(unknowns.items()):
-                        destination = self.trimFullName(destination)
-                        source = self.trimFullName(source)
+                    for destination, source in sorted(unknowns.items(), key=lambda item: protobuf._formatPath(item[0])):
+                        destination = self.trimPath(destination)
+                        source = self.trimPath(source)
                         if fatal:
                             composite.logger.error(f'Observed unknown: {destination} = {source}')
                         elif warning:
@@ -303,7 +367,7 @@ class FunctionRunner(grpcv1.FunctionRunnerService):
                 if resource.observed:
                     resource.desired._patchUnknowns(resource.observed)
                 elif self.renderUnknowns:
-                    resource.desired._renderUnknowns(self.trimFullName)
+                    resource.desired._renderUnknowns(self.trimPath)
                 else:
                     del composite.resources[name]
 
@@ -337,41 +401,14 @@ class FunctionRunner(grpcv1.FunctionRunnerService):
         if result:
             result(reason, message)
 
-    def trimFullName(self, name):
-        name = name.split('.')
-        for values in (
-                ('request', 'observed', 'composite', 'resource'),
-                ('response', 'desired', 'composite', 'resource'),
-                ('request', 'observed', 'resources', None, 'resource'),
-                ('response', 'desired', 'resources', None, 'resource'),
-                ('request', 'required_resources', None, 'items', None, 'resource'),
-                ('request', 'extra_resources', None, 'items', None, 'resource'),
-        ):
-            if len(values) < len(name):
-                ix = 0
-                for iv, value in enumerate(values):
-                    if value:
-                        if value != name[ix]:
-                            if not name[ix].startswith(f"{values[iv]}[") or iv+1 >= len(values) or values[iv+1]:
-                                break
-                            continue
-                    ix += 1
-                else:
-                    ix = 0
-                    for value in values:
-                        if value:
-                            if value == name[ix]:
-                                del name[ix]
-                            elif ix:
-                                name[ix-1] += name[ix][len(value):]
-                                del name[ix]
-                            else:
-                                name[ix] = name[ix][len(value):]
-                        else:
-                            ix += 1
-                    break
-        return '.'.join(name)
-
+    def trimPath(self, path):
+        # Composite and resource paths are relative to the resource, for example vpc.status.id
+        match path:
+            case ('request', 'observed', 'composite', 'resource', *fields) | ('response', 'desired', 'composite', 'resource', *fields) if fields:
+                return protobuf._formatPath(fields)
+            case ('request', 'observed', 'resources', name, 'resource', *fields) | ('response', 'desired', 'resources', name, 'resource', *fields) if fields:
+                return protobuf._formatPath((name, *fields))
+        return protobuf._formatPath(path)
 
 def ordinal(ix):
     ix = int(ix)
@@ -394,3 +431,5 @@ class Module:
         self.Json = pythonic.Json
         self.B64Encode = pythonic.B64Encode
         self.B64Decode = pythonic.B64Decode
+        self.Path = pythonic.Path
+        self.Query = pythonic.Query
@@ -1,19 +1,26 @@
 
 import asyncio
 import logging
+import multiprocessing
 import os
 import pathlib
 import shlex
 import signal
 import sys
+import threading
 
-import crossplane.function.proto.v1.run_function_pb2_grpc as grpcv1
+import crossplane.function.proto.v1.run_function_pb2 as fnv1
 import grpc
 
 from . import (
     __about__,
+    admission,
     command,
     function,
+    metrics,
+    profiler,
+    protobuf,
+    replay,
 )
 
 logger = logging.getLogger(__name__)
@@ -42,6 +49,120 @@ class Command(command.Command):
             action='store_true',
             help='Run without mTLS credentials, --tls-certs-dir will be ignored.',
         )
+        parser.add_argument(
+            '--composite-cache-size',
+            type=int,
+            default=256,
+            metavar='SIZE',
+            help='Maximum number of composite classes to keep loaded, default 256.',
+        )
+        parser.add_argument(
+            '--parse-cache-size',
+            type=int,
+            default=0,
+            metavar='SIZE',
+            help='Maximum number of parsed Yaml, YamlAll, and Json texts to keep, default 0 disables the cache.',
+        )
+        parser.add_argument(
+            '--weak-read-caches',
+            action='store_true',
+            help='Hold read only scalar values weakly, lowering memory for large observed resources at the cost of re-reads.',
+        )
+        parser.add_argument(
+            '--compose-workers',
+            type=int,
+            default=0,
+            metavar='WORKERS',
+            help='Run compose in a pool of WORKERS processes, default 0 runs compose in the gRPC server process.',
+        )
+        parser.add_argument(
+            '--processes',
+            type=int,
+            default=1,
+            metavar='PROCESSES',
+            help='Number of gRPC server processes listening on the address using SO_REUSEPORT, default 1.',
+        )
+        parser.add_argument(
+            '--max-in-flight',
+            type=int,
+            default=0,
+            metavar='REQUESTS',
+            help='Maximum number of requests processed at once, default 0 is unlimited.',
+        )
+        parser.add_argument(
+            '--max-queued',
+            type=int,
+            default=100,
+            metavar='REQUESTS',
+            help='Maximum number of requests waiting for --max-in-flight, further requests fail with RESOURCE_EXHAUSTED, default 100.',
+        )
+        parser.add_argument(
+            '--queue-timeout',
+            type=float,
+            metavar='SECONDS',
+            help='Fail requests waiting longer than SECONDS for --max-in-flight with RESOURCE_EXHAUSTED, default waits indefinitely.',
+        )
+        parser.add_argument(
+            '--metrics-address',
+            metavar='ADDRESS',
+            help='Address to serve Prometheus metrics on, for example 0.0.0.0:8080, with --processes the port is incremented for each process, default disabled.',
+        )
+        parser.add_argument(
+            '--profile-dir',
+            metavar='DIRECTORY',
+            help='Directory to write compose() profiles to, profiling is toggled by sending the process SIGUSR1, default disabled.',
+        )
+        parser.add_argument(
+            '--profile',
+            action='store_true',
+            help='Start with compose() profiling enabled, requires --profile-dir.',
+        )
+        parser.add_argument(
+            '--profile-every',
+            type=int,
+            default=100,
+            metavar='CALLS',
+            help='Profile every CALLS compose() calls of each composite class, default 100.',
+        )
+        parser.add_argument(
+            '--profile-format',
+            choices=('collapsed', 'pstats'),
+            default='collapsed',
+            help='Write sampled collapsed stacks or cProfile pstats, default collapsed.',
+        )
+        parser.add_argument(
+            '--profile-max-size',
+            type=int,
+            default=64,
+            metavar='MEGABYTES',
+            help='Maximum size of the profile directory, the oldest profiles are deleted, default 64.',
+        )
+        parser.add_argument(
+            '--record-dir',
+            metavar='DIRECTORY',
+            help='Directory to record requests and responses to, for use with the replay command, default disabled.',
+        )
+        parser.add_argument(
+            '--record-rate',
+            type=float,
+            default=1.0,
+            metavar='RATE',
+            help='Fraction of requests to record, default 1.0 records all requests.',
+        )
+        parser.add_argument(
+            '--record-max-size',
+            type=int,
+            default=64,
+            metavar='MEGABYTES',
+            help='Size a record file grows to before starting a new one, default 64.',
+        )
+        parser.add_argument(
+            '--record-max-files',
+            type=int,
+            default=10,
+            metavar='FILES',
+            help='Maximum number of record files to keep, the oldest are deleted, default 10.',
+        )
         parser.add_argument(
             '--packages',
             action='store_true',
@@ -104,11 +225,49 @@ class Command(command.Command):
         # enables read only volumes or mismatched uid volumes
         sys.dont_write_bytecode = True
 
+    def packages_enabled(self):
+        return self.args.packages_configmaps or self.args.packages_secrets or self.args.packages_environmentconfigs or self.args.packages_compositions
+
+    def packages_operator(self, grpc_server, grpc_runner):
+        from . import packages
+        return packages.operator(
+            grpc_server,
+            grpc_runner,
+            self.args.packages_configmaps,
+            self.args.packages_secrets,
+            self.args.packages_namespace,
+            self.args.packages_environmentconfigs,
+            self.args.packages_compositions,
+            self.args.packages_dir,
+        )
+
     async def run(self):
+        if self.args.processes > 1:
+            await Supervisor(self).run()
+        else:
+            await self.serve()
+
+    async def serve(self, invalidations=None):
         grpc.aio.init_grpc_aio()
-        grpc_runner = function.FunctionRunner(self.args.render_unknowns, self.args.crossplane_v1)
-        grpc_server = grpc.aio.server()
-        grpcv1.add_FunctionRunnerServiceServicer_to_server(grpc_runner, grpc_server)
+        grpc_runner = function.FunctionRunner(self.args.render_unknowns, self.args.crossplane_v1, self.args.composite_cache_size)
+        protobuf.PARSE_CACHE.size = self.args.parse_cache_size
+        protobuf.WEAK_CACHES = self.args.weak_read_caches
+        if self.args.compose_workers > 0:
+            from . import workers
+            grpc_runner.compose_pool = workers.ComposePool(self.args.compose_workers, self.args)
+        if self.args.max_in_flight > 0:
+            grpc_runner.admission = admission.Admission(self.args.max_in_flight, self.args.max_queued, self.args.queue_timeout)
+        if self.args.profile_dir and not grpc_runner.compose_pool:
+            grpc_runner.profiler = profiler.create(self.args)
+        if self.args.record_dir:
+            grpc_runner.recorder = replay.Recorder(
+                self.args.record_dir,
+                self.args.record_rate,
+                self.args.record_max_size * 1024 * 1024,
+                self.args.record_max_files,
+            )
+        grpc_server = grpc.aio.server(options=[('grpc.so_reuseport', 1)] if invalidations else None)
+        add_runner_to_server(grpc_runner, grpc_server)
         if self.args.insecure:
             grpc_server.add_insecure_port(self.args.address)
         else:
@@ -125,21 +284,26 @@ class Command(command.Command):
                 ),
             )
         await grpc_server.start()
+        if self.args.metrics_address:
+            metrics.register_runner(grpc_runner)
+            metrics_server = await metrics.serve(self.args.metrics_address)
+        if grpc_runner.profiler:
+            asyncio.get_running_loop().add_signal_handler(signal.SIGUSR1, grpc_runner.profiler.toggle)
+        elif self.args.profile_dir:
+            asyncio.get_running_loop().add_signal_handler(signal.SIGUSR1, grpc_runner.compose_pool.signal, signal.SIGUSR1)
+
+        if invalidations:
+            # Module invalidations are sent by the supervisor's packages operator
+            loop = asyncio.get_running_loop()
+            def receive():
+                while True:
+                    loop.call_soon_threadsafe(grpc_runner.invalidate_module, invalidations.get())
+            threading.Thread(target=receive, name='invalidations', daemon=True).start()
 
-        if self.args.packages_configmaps or self.args.packages_secrets or self.args.packages_environmentconfigs or self.args.packages_compositions:
-            from . import packages
+        if not invalidations and self.packages_enabled():
             async with asyncio.TaskGroup() as tasks:
                 tasks.create_task(grpc_server.wait_for_termination())
-                tasks.create_task(packages.operator(
-                    grpc_server,
-                    grpc_runner,
-                    self.args.packages_configmaps,
-                    self.args.packages_secrets,
-                    self.args.packages_namespace,
-                    self.args.packages_environmentconfigs,
-                    self.args.packages_compositions,
-                    self.args.packages_dir,
-                ))
+                tasks.create_task(self.packages_operator(grpc_server, grpc_runner))
         else:
             def stop():
                 asyncio.ensure_future(grpc_server.stop(5))
@@ -147,3 +311,110 @@ class Command(command.Command):
             loop.add_signal_handler(signal.SIGINT, stop)
             loop.add_signal_handler(signal.SIGTERM, stop)
             await grpc_server.wait_for_termination()
+
+        if self.args.metrics_address:
+            metrics_server.close()
+        if grpc_runner.recorder:
+            grpc_runner.recorder.close()
+        if grpc_runner.compose_pool:
+            grpc_runner.compose_pool.shutdown()
+
+
+def add_runner_to_server(grpc_runner, grpc_server):
+    # Same as grpcv1.add_FunctionRunnerServiceServicer_to_server, timing response serialization
+    handlers = {
+        'RunFunction': grpc.unary_unary_rpc_method_handler(
+            grpc_runner.RunFunction,
+            request_deserializer=fnv1.RunFunctionRequest.FromString,
+            response_serializer=metrics.serialize_response,
+        ),
+    }
+    grpc_server.add_generic_rpc_handlers((grpc.method_handlers_generic_handler('apiextensions.fn.proto.v1.FunctionRunnerService', handlers),))
+    grpc_server.add_registered_method_handlers('apiextensions.fn.proto.v1.FunctionRunnerService', handlers)
+
+
+class Supervisor:
+    """Runs gRPC server worker processes sharing the address using SO_REUSEPORT.
+
+    Dead workers are restarted and module invalidations from the packages
+    operator are sent to every worker. The supervisor stands in for both the
+    gRPC server and the FunctionRunner when running the packages operator.
+    """
+
+    def __init__(self, grpc_command):
+        self.command = grpc_command
+        self.context = multiprocessing.get_context('spawn')
+        self.processes = [None] * grpc_command.args.processes
+        self.invalidations = [None] * grpc_command.args.processes
+        self.stopping = False
+
+    async def run(self):
+        if self.command.packages_enabled():
+            # Creating the operator adds the packages directory to sys.path, do so before starting workers.
+            operator = self.command.packages_operator(self, self)
+        else:
+            operator = None
+            loop = asyncio.get_running_loop()
+            loop.add_signal_handler(signal.SIGINT, lambda: asyncio.ensure_future(self.stop(5)))
+            loop.add_signal_handler(signal.SIGTERM, lambda: asyncio.ensure_future(self.stop(5)))
+        if self.command.args.profile_dir:
+            asyncio.get_running_loop().add_signal_handler(signal.SIGUSR1, self.signal, signal.SIGUSR1)
+        for ix in range(len(self.processes)):
+            self.start(ix)
+        if operator:
+            async with asyncio.TaskGroup() as tasks:
+                tasks.create_task(self.wait_for_termination())
+                tasks.create_task(operator)
+        else:
+            await self.wait_for_termination()
+
+    def start(self, ix):
+        self.invalidations[ix] = self.context.SimpleQueue()
+        self.processes[ix] = self.context.Process(
+            target=worker,
+            args=(self.command.args, list(sys.path), self.invalidations[ix], ix),
+            name=f"grpc-worker-{ix}",
+        )
+        self.processes[ix].start()
+        logger.info(f"Started gRPC worker {ix}, pid {self.processes[ix].pid}")
+
+    def signal(self, signum):
+        for process in self.processes:
+            if process.is_alive():
+                os.kill(process.pid, signum)
+
+    def invalidate_module(self, module):
+        for invalidations in self.invalidations:
+            invalidations.put(module)
+
+    async def stop(self, grace=None):
+        self.stopping = True
+        for process in self.processes:
+            if process.is_alive():
+                process.terminate()
+
+    async def wait_for_termination(self):
+        while True:
+            await asyncio.sleep(1)
+            alive = False
+            for ix, process in enumerate(self.processes):
+                if process.is_alive():
+                    alive = True
+                elif not self.stopping:
+                    logger.warning(f"gRPC worker {ix}, pid {process.pid}, exited with {process.exitcode}, restarting")
+                    process.close()
+                    self.start(ix)
+                    alive = True
+            if not alive:
+                return
+
+
+def worker(args, path, invalidations, ix):
+    args.processes = 1
+    args.pip_install = None # Already installed by the supervisor
+    if args.metrics_address:
+        host, port = args.metrics_address.rsplit(':', 1)
+        args.metrics_address = f"{host}:{int(port) + ix}"
+    command = Command(args)
+    sys.path[:] = path
+    asyncio.run(command.serve(invalidations))
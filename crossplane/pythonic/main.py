@@ -5,8 +5,10 @@ import asyncio
 import sys
 
 from . import (
+    bench,
     grpc,
     render,
+    replay,
     version,
 )
 
@@ -14,8 +16,10 @@ from . import (
 def main():
     parser = argparse.ArgumentParser('Crossplane Function Pythonic')
     subparsers = parser.add_subparsers(title='Command', metavar='')
+    bench.Command.create(subparsers)
     grpc.Command.create(subparsers)
     render.Command.create(subparsers)
+    replay.Command.create(subparsers)
     version.Command.create(subparsers)
     args = parser.parse_args()
     if not hasattr(args, 'command'):
@@ -0,0 +1,201 @@
+
+import asyncio
+import bisect
+import contextvars
+import logging
+import time
+
+from . import protobuf
+
+logger = logging.getLogger(__name__)
+
+BUCKETS = (.0001, .00025, .0005, .001, .0025, .005, .01, .025, .05, .1, .25, .5, 1.0, 2.5, 5.0, 10.0)
+
+# The composite and step labels of the request being processed, used when serializing the response
+LABELS = contextvars.ContextVar('labels', default=('', ''))
+
+
+class Phases:
+    """Times the phases of a single RunFunction request."""
+
+    def __init__(self):
+        self.composite = ''
+        self.step = ''
+        self.result = 'fatal'
+        self.phases = []
+        self.start = time.perf_counter()
+
+    def phase(self, name):
+        now = time.perf_counter()
+        self.phases.append((name, now - self.start))
+        self.start = now
+
+
+class Counter:
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.values = {}
+
+    def inc(self, labels=(), value=1):
+        self.values[labels] = self.values.get(labels, 0) + value
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} counter"
+        for labels, value in sorted(self.values.items()):
+            yield f"{self.name}{format_labels(self.labels, labels)} {format_value(value)}"
+
+
+class Histogram:
+    def __init__(self, name, help, labels=(), buckets=BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = buckets
+        self.values = {}
+
+    def observe(self, labels, value):
+        observed = self.values.get(labels)
+        if observed is None:
+            # Per bucket counts, sum, and count
+            observed = self.values[labels] = [[0] * len(self.buckets), 0.0, 0]
+        ix = bisect.bisect_left(self.buckets, value)
+        if ix < len(self.buckets):
+            observed[0][ix] += 1
+        observed[1] += value
+        observed[2] += 1
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} histogram"
+        for labels, (buckets, sum, count) in sorted(self.values.items()):
+            cumulative = 0
+            for bucket, value in zip(self.buckets, buckets, strict=True):
+                cumulative += value
+                yield f"{self.name}_bucket{format_labels(self.labels + ('le',), labels + (format_value(bucket),))} {cumulative}"
+            yield f"{self.name}_bucket{format_labels(self.labels + ('le',), labels + ('+Inf',))} {count}"
+            yield f"{self.name}_sum{format_labels(self.labels, labels)} {format_value(sum)}"
+            yield f"{self.name}_count{format_labels(self.labels, labels)} {count}"
+
+
+class Gauge:
+    """A gauge, or counter, whose value is read from a function when rendered."""
+
+    def __init__(self, name, help, function, type='gauge'):
+        self.name = name
+        self.help = help
+        self.function = function
+        self.type = type
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} {self.type}"
+        yield f"{self.name} {format_value(self.function())}"
+
+
+REQUESTS = Counter(
+    'function_pythonic_requests_total',
+    'RunFunction requests by composite class, step, and result.',
+    ('composite', 'step', 'result'),
+)
+PHASES = Histogram(
+    'function_pythonic_phase_seconds',
+    'RunFunction phase durations by composite class, step, and phase.',
+    ('composite', 'step', 'phase'),
+)
+METRICS = [REQUESTS, PHASES]
+
+
+def observe(composite, step, result, phases):
+    REQUESTS.inc((composite, step, result))
+    for phase, seconds in phases:
+        PHASES.observe((composite, step, phase), seconds)
+    LABELS.set((composite, step))
+
+
+def serialize_response(response):
+    start = time.perf_counter()
+    response = response.SerializeToString()
+    composite, step = LABELS.get()
+    PHASES.observe((composite, step, 'serialize'), time.perf_counter() - start)
+    return response
+
+
+def register_runner(runner):
+    """Add gauges for the caches and admission control of a FunctionRunner."""
+    clazzes = runner.clazzes
+    METRICS.append(Gauge('function_pythonic_composite_cache_size', 'Number of composite classes loaded.', lambda: len(clazzes)))
+    METRICS.append(Gauge('function_pythonic_composite_cache_hits_total', 'Composite class cache hits.', lambda: clazzes.hits, 'counter'))
+    METRICS.append(Gauge('function_pythonic_composite_cache_misses_total', 'Composite class cache misses.', lambda: clazzes.misses, 'counter'))
+    METRICS.append(Gauge('function_pythonic_composite_cache_evictions_total', 'Composite class cache evictions.', lambda: clazzes.evictions, 'counter'))
+    parses = protobuf.PARSE_CACHE
+    if parses.size > 0:
+        METRICS.append(Gauge('function_pythonic_parse_cache_size', 'Number of parsed Yaml and Json texts cached.', lambda: len(parses)))
+        METRICS.append(Gauge('function_pythonic_parse_cache_hits_total', 'Parse cache hits.', lambda: parses.hits, 'counter'))
+        METRICS.append(Gauge('function_pythonic_parse_cache_misses_total', 'Parse cache misses.', lambda: parses.misses, 'counter'))
+        METRICS.append(Gauge('function_pythonic_parse_cache_evictions_total', 'Parse cache evictions.', lambda: parses.evictions, 'counter'))
+    admission = runner.admission
+    if admission:
+        METRICS.append(Gauge('function_pythonic_in_flight', 'Number of requests being processed.', lambda: admission.in_flight))
+        METRICS.append(Gauge('function_pythonic_queued', 'Number of requests waiting to be processed.', lambda: admission.queued))
+        METRICS.append(Gauge('function_pythonic_admitted_total', 'Requests admitted for processing.', lambda: admission.admitted, 'counter'))
+        METRICS.append(Gauge('function_pythonic_rejected_total', 'Requests rejected with RESOURCE_EXHAUSTED.', lambda: admission.rejected, 'counter'))
+        METRICS.append(Gauge('function_pythonic_queue_wait_seconds_total', 'Total time requests waited to be processed.', lambda: admission.wait_seconds, 'counter'))
+
+
+def render():
+    lines = []
+    for metric in METRICS:
+        lines.extend(metric.render())
+    lines.append('')
+    return '\n'.join(lines)
+
+
+def format_labels(names, values):
+    if not names:
+        return ''
+    return '{' + ','.join(f'{name}="{escape(value)}"' for name, value in zip(names, values, strict=True)) + '}'
+
+
+def escape(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def format_value(value):
+    if isinstance(value, float):
+        return repr(value)
+    return str(value)
+
+
+async def serve(address):
+    host, port = address.rsplit(':', 1)
+    server = await asyncio.start_server(handle, host, int(port))
+    logger.info(f"Serving metrics on {address}")
+    return server
+
+
+async def handle(reader, writer):
+    try:
+        request = await reader.readline()
+        while (await reader.readline()) not in (b'\r\n', b'\n', b''):
+            pass
+        request = request.split()
+        if len(request) >= 2 and request[0] == b'GET' and request[1].split(b'?')[0] in (b'/metrics', b'/'):
+            status = b'200 OK'
+            body = render().encode('utf-8')
+        else:
+            status = b'404 Not Found'
+            body = b'Not Found\n'
+        writer.write(
+            b'HTTP/1.1 ' + status + b'\r\n'
+            b'Content-Type: text/plain; version=0.0.4; charset=utf-8\r\n'
+            b'Content-Length: ' + str(len(body)).encode() + b'\r\n'
+            b'Connection: close\r\n\r\n' + body
+        )
+        await writer.drain()
+    except Exception as e:
+        logger.debug(f"Metrics request failed: {e}")
+    finally:
+        writer.close()
@@ -0,0 +1,138 @@
+
+import cProfile
+import collections
+import contextlib
+import logging
+import os
+import pathlib
+import re
+import sys
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+def create(args):
+    return Profiler(
+        args.profile_dir,
+        args.profile_every,
+        args.profile_format,
+        args.profile_max_size * 1024 * 1024,
+        enabled=args.profile,
+    )
+
+
+class Profiler:
+    """Profiles every Nth compose() call of each composite class.
+
+    Profiling is enabled for all composite classes using enabled, toggled by
+    toggle(), or for a single composite class by setting its profile class
+    attribute to True. Profiles accumulate per composite class, in collapsed
+    stack files for flame graph tools or in pstats files, and the oldest files
+    are deleted when the directory grows beyond max_bytes.
+    """
+
+    def __init__(self, directory, every=100, format='collapsed', max_bytes=64 * 1024 * 1024, interval=0.001, enabled=False):
+        self.directory = pathlib.Path(directory).expanduser().resolve()
+        self.every = max(every, 1)
+        self.format = format
+        self.max_bytes = max_bytes
+        self.interval = interval
+        self.enabled = enabled
+        self.calls = collections.Counter()
+        self.profiles = {}
+        # Only one cProfile profile can be enabled at a time
+        self.pstats_active = False
+
+    def toggle(self):
+        self.enabled = not self.enabled
+        logger.info(f"Compose profiling {'enabled' if self.enabled else 'disabled'}, writing to {self.directory}")
+
+    def profile(self, clazz, name):
+        if not self.enabled and getattr(clazz, 'profile', False) is not True:
+            return contextlib.nullcontext()
+        self.calls[name] += 1
+        if (self.calls[name] - 1) % self.every:
+            return contextlib.nullcontext()
+        if self.format == 'pstats':
+            if self.pstats_active:
+                return contextlib.nullcontext()
+            return PStats(self, name)
+        return Sampler(self, name)
+
+    def path(self, name, suffix):
+        return self.directory / f"{re.sub(r'[^A-Za-z0-9_.-]', '_', name)}.{os.getpid()}.{suffix}"
+
+    def write(self, path, write):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        write(path)
+        files = sorted(
+            (file for file in self.directory.iterdir() if file.is_file()),
+            key=lambda file: file.stat().st_mtime,
+        )
+        size = sum(file.stat().st_size for file in files)
+        for file in files:
+            if size <= self.max_bytes:
+                break
+            if file != path:
+                size -= file.stat().st_size
+                file.unlink(missing_ok=True)
+
+
+class Sampler:
+    """Samples the stack of the compose() call from a background thread, writing collapsed stacks."""
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+        self.stacks = collections.Counter()
+        self.stopped = threading.Event()
+
+    def __enter__(self):
+        self.caller = sys._getframe(1)
+        self.thread_id = threading.get_ident()
+        self.thread = threading.Thread(target=self.sample, name='compose-profiler', daemon=True)
+        self.thread.start()
+
+    def __exit__(self, *exception):
+        self.stopped.set()
+        self.thread.join()
+        stacks = self.profiler.profiles.setdefault(self.name, collections.Counter())
+        stacks.update(self.stacks)
+        def write(path):
+            with path.open('w') as file:
+                for stack, count in stacks.most_common():
+                    file.write(f"{stack} {count}\n")
+        self.profiler.write(self.profiler.path(self.name, 'collapsed'), write)
+
+    def sample(self):
+        while not self.stopped.wait(self.profiler.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None and frame is not self.caller:
+                code = frame.f_code
+                stack.append(f"{os.path.basename(code.co_filename)}:{code.co_qualname}")
+                frame = frame.f_back
+            # Samples without the caller are taken while compose() is awaiting
+            if frame is not None and stack and not self.stopped.is_set():
+                self.stacks[';'.join(reversed(stack))] += 1
+
+
+class PStats:
+    """Profiles the compose() call using cProfile, writing pstats."""
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.profile = self.profiler.profiles.get(self.name)
+        if self.profile is None:
+            self.profile = self.profiler.profiles[self.name] = cProfile.Profile()
+        self.profiler.pstats_active = True
+        self.profile.enable()
+
+    def __exit__(self, *exception):
+        self.profile.disable()
+        self.profiler.pstats_active = False
+        self.profiler.write(self.profiler.path(self.name, 'pstats'), lambda path: self.profile.dump_stats(str(path)))
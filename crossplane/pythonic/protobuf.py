@@ -16,14 +16,38 @@
 ##################################################################################
 
 import base64
-import datetime
 import google.protobuf.struct_pb2
+import hashlib
 import json
+import operator
+import re
 import sys
+import weakref
 import yaml
 
+from . import cache
+
 _Unknown = object()
 append = sys.maxsize
+# The libyaml loader when available, it loads documents identically to the Python loader.
+# Dumping stays with the Python emitter, libyaml folds and quotes some scalars differently.
+SafeLoader = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+# Parsed Yaml, YamlAll, and Json text, disabled until given a size
+PARSE_CACHE = cache.LRUCache(0)
+# Read only wrappers hold their scalar children weakly when enabled, so unreferenced leaves
+# are freed, at the cost of recreating them when read again
+WEAK_CACHES = False
+
+
+class _NativeUnknown:
+    def __bool__(self):
+        return False
+
+    def __repr__(self):
+        return '<<UNKNOWN>>'
+
+# Placeholder for unknown values returned by _toNative()
+UNKNOWN = _NativeUnknown()
 
 
 def Map(**kwargs):
@@ -40,21 +64,36 @@ def Yaml(string, readOnly=None):
         if not string:
             return string
         string = str(string)
-    return Value(None, None, yaml.safe_load(string), readOnly)
+    return _parse('yaml', string, readOnly, lambda string: yaml.load(string, Loader=SafeLoader))
 
 def YamlAll(string, readOnly=None):
     if isinstance(string, (FieldMessage, Value)):
         if not string:
             return string
         string = str(string)
-    return Value(None, None, [document for document in yaml.safe_load_all(string)], readOnly)
+    return _parse('yamlall', string, readOnly, lambda string: [document for document in yaml.load_all(string, Loader=SafeLoader)])
 
 def Json(string, readOnly=None):
     if isinstance(string, (FieldMessage, Value)):
         if not string:
             return string
         string = str(string)
-    return Value(None, None, json.loads(string), readOnly)
+    return _parse('json', string, readOnly, json.loads)
+
+def _parse(parser, string, readOnly, load):
+    if PARSE_CACHE.size <= 0 or not isinstance(string, str):
+        return Value(None, None, load(string), readOnly)
+    key = (parser, hashlib.blake2b(string.encode('utf-8'), digest_size=16).digest())
+    value = PARSE_CACHE.get(key)
+    if value is None:
+        value = Value(None, None, load(string))._value
+        PARSE_CACHE.put(key, value)
+    if not readOnly:
+        # Read only values share the cached value, others get their own copy
+        copy = google.protobuf.struct_pb2.Value()
+        copy.CopyFrom(value)
+        value = copy
+    return Value(None, None, value, readOnly)
 
 def B64Encode(string):
     if isinstance(string, (FieldMessage, Value)):
@@ -72,6 +111,8 @@ def B64Decode(string):
 
 
 class Message:
+    __slots__ = ('_parent', '_key', '_descriptor', '_message', '_readOnly', '_cache', '_digested', '_mutations', '__weakref__')
+
     def __init__(self, parent, key, descriptor, message=_Unknown, readOnly=False):
         self._set_attribute('_parent', parent)
         self._set_attribute('_key', key)
@@ -79,17 +120,23 @@ class Message:
         self._set_attribute('_message', message)
         self._set_attribute('_readOnly', readOnly)
         self._set_attribute('_cache', {})
+        self._set_attribute('_digested', None)
+        self._set_attribute('_mutations', None if readOnly else _Mutations() if parent is None else parent._mutations)
 
     def _set_attribute(self, key, value):
-        self.__dict__[key] = value
+        object.__setattr__(self, key, value)
 
     def __getattr__(self, key):
         return self[key]
 
     def __getitem__(self, key):
         key = self._validate_key(key)
-        if key in self._cache:
-            return self._cache[key]
+        value = self._cache.get(key)
+        if value is not None:
+            if type(value) is weakref.ref:
+                value = value()
+            if value is not None:
+                return value
         field = self._descriptor.fields_by_name.get(key)
         if not field:
             raise AttributeError(obj=self, name=key)
@@ -111,7 +158,7 @@ class Message:
                 value = Message(self, key, field.message_type, value, self._readOnly)
         else:
             value = FieldMessage(self, key, field.type, value)
-        self._cache[key] = value
+        self._cache[key] = weakref.ref(value) if WEAK_CACHES and self._readOnly and isinstance(value, FieldMessage) else value
         return value
 
     def __bool__(self):
@@ -129,7 +176,10 @@ class Message:
 
     def __hash__(self):
         if self._message is not _Unknown:
-            return hash(tuple(hash(item) for item in sorted(iter(self), key=lambda item: item[0])))
+            digest = self._digest()
+            if digest is not None:
+                return _digestHash(digest)
+            return _structuralHash(self)
         return 0
 
     def __eq__(self, other):
@@ -141,6 +191,9 @@ class Message:
             return other._message is _Unknown
         elif other._message is _Unknown:
             return False
+        equal = _digestEqual(self, other)
+        if equal is not None:
+            return equal
         if len(self) != len(other):
             return False
         for key, value in self:
@@ -150,41 +203,48 @@ class Message:
                 return False
         return True
 
+    def _digest(self):
+        return _digest(self, lambda: _encodeMessage(self._message))
+
     def __str__(self):
         return format(self)
 
     def __format__(self, spec='yaml'):
         return _formatObject(self, spec)
 
+    def _path(self, key=None):
+        return _wrapperPath(self, key)
+
     def _fullName(self, key=None):
-        if self._key is not None:
-            if self._parent is not None:
-                name = self._parent._fullName(self._key)
+        return _formatPath(self._path(key))
+
+    def _toNative(self, unknown=UNKNOWN):
+        if self._message is _Unknown:
+            return None
+        native = {}
+        for key, field in sorted(self._descriptor.fields_by_name.items()):
+            value = _cachedChild(self, key)
+            if value is not None:
+                native[key] = value._toNative(unknown)
             else:
-                name = str(self._key)
-            if key is not None:
-                if '.' in key:
-                    name += f"[{key}]"
-                else:
-                    name += f".{key}"
-            return name
-        if key is not None:
-            return str(key)
-        return ''
+                native[key] = _nativeField(field, getattr(self._message, key), unknown)
+        return native
 
     def _create_child(self, key):
         if self._readOnly:
             raise ValueError(f"{self._readOnly} is read only")
+        _mutated(self)
         key = self._validate_key(key)
         if self._message is _Unknown:
-            self.__dict__['_message'] = self._parent._create_child(self._key)
+            self._set_attribute('_message', self._parent._create_child(self._key))
         return getattr(self._message, key)
 
     def __call__(self, **kwargs):
         if self._readOnly:
             raise ValueError(f"{self._readOnly} is read only")
+        _mutated(self)
         if self._message is _Unknown:
-            self.__dict__['_message'] = self._parent._create_child(self._key)
+            self._set_attribute('_message', self._parent._create_child(self._key))
         self._message.Clear()
         self._cache.clear()
         for key, value in kwargs.items():
@@ -197,12 +257,13 @@ class Message:
     def __setitem__(self, key, value):
         if self._readOnly:
             raise ValueError(f"{self._readOnly} is read only")
+        _mutated(self)
         key = self._validate_key(key)
         if key not in self._descriptor.fields_by_name:
             raise AttributeError(obj=self, name=key)
         field = self._descriptor.fields_by_name[key]
         if self._message is _Unknown:
-            self.__dict__['_message'] = self._parent._create_child(self._key)
+            self._set_attribute('_message', self._parent._create_child(self._key))
         if isinstance(value, Message):
             value = value._message
         elif isinstance(value, (MapMessage, RepeatedMessage)):
@@ -222,6 +283,7 @@ class Message:
     def __delitem__(self, key):
         if self._readOnly:
             raise ValueError(f"{self._readOnly} is read only")
+        _mutated(self)
         key = self._validate_key(key)
         if key not in self._descriptor.fields_by_name:
             raise AttributeError(obj=self, name=key)
@@ -240,6 +302,8 @@ class Message:
 
 
 class MapMessage:
+    __slots__ = ('_parent', '_key', '_field', '_messages', '_readOnly', '_cache', '_digested', '_mutations', '__weakref__')
+
     def __init__(self, parent, key, field, messages=_Unknown, readOnly=False):
         self._set_attribute('_parent', parent)
         self._set_attribute('_key', key)
@@ -247,17 +311,23 @@ class MapMessage:
         self._set_attribute('_messages', messages)
         self._set_attribute('_readOnly', readOnly)
         self._set_attribute('_cache', {})
+        self._set_attribute('_digested', None)
+        self._set_attribute('_mutations', None if readOnly else _Mutations() if parent is None else parent._mutations)
 
     def _set_attribute(self, key, value):
-        self.__dict__[key] = value
+        object.__setattr__(self, key, value)
 
     def __getattr__(self, key):
         return self[key]
 
     def __getitem__(self, key):
         key = self._validate_key(key)
-        if key in self._cache:
-            return self._cache[key]
+        value = self._cache.get(key)
+        if value is not None:
+            if type(value) is weakref.ref:
+                value = value()
+            if value is not None:
+                return value
         if self._messages is _Unknown or key not in self._messages:
             value = _Unknown
         else:
@@ -271,7 +341,7 @@ class MapMessage:
                 value = Message(self, key, self._field.message_type, value, self._readOnly)
         else:
             value = FieldMessage(self, key, self._field.type, value)
-        self._cache[key] = value
+        self._cache[key] = weakref.ref(value) if WEAK_CACHES and self._readOnly and isinstance(value, FieldMessage) else value
         return value
 
     def __bool__(self):
@@ -289,8 +359,11 @@ class MapMessage:
                 yield key, self[key]
 
     def __hash__(self):
-        if self._nessages is not None:
-            return hash(tuple(hash(item) for item in sorted(iter(self), key=lambda item: item[0])))
+        if self._messages is not _Unknown:
+            digest = self._digest()
+            if digest is not None:
+                return _digestHash(digest)
+            return _structuralHash(self)
         return 0
 
     def __eq__(self, other):
@@ -305,6 +378,9 @@ class MapMessage:
             return other._messages is _Unknown
         elif other._messages is _Unknown:
             return False
+        equal = _digestEqual(self, other)
+        if equal is not None:
+            return equal
         if len(self) != len(other):
             return False
         for key, value in self:
@@ -314,41 +390,48 @@ class MapMessage:
                 return False
         return True
 
+    def _digest(self):
+        return _digest(self, lambda: _encodeMap(self._field, self._messages))
+
     def __str__(self):
         return format(self)
 
     def __format__(self, spec='yaml'):
         return _formatObject(self, spec)
 
+    def _path(self, key=None):
+        return _wrapperPath(self, key if key is None else _DottedKey(key))
+
     def _fullName(self, key=None):
-        if self._key is not None:
-            if self._parent is not None:
-                name = self._parent._fullName(self._key)
+        return _formatPath(self._path(key))
+
+    def _toNative(self, unknown=UNKNOWN):
+        if self._messages is _Unknown:
+            return None
+        native = {}
+        for key in sorted(self._messages):
+            value = _cachedChild(self, key)
+            if value is not None:
+                native[key] = value._toNative(unknown)
             else:
-                name = str(self._key)
-            if key is not None:
-                if '.' in key:
-                    name += f"[{key}]"
-                else:
-                    name += f".{key}"
-            return name
-        if key is not None:
-            return str(key)
-        return ''
+                native[key] = _nativeElement(self._field, self._messages[key], unknown)
+        return native
 
     def _create_child(self, key):
         if self._readOnly:
             raise ValueError(f"{self._readOnly} is read only")
+        _mutated(self)
         key = self._validate_key(key)
         if self._messages is _Unknown:
-            self.__dict__['_messages'] = self._parent._create_child(self._key)
+            self._set_attribute('_messages', self._parent._create_child(self._key))
         return self._messages[key]
 
     def __call__(self, **kwargs):
         if self._readOnly:
             raise ValueError(f"{self._readOnly} is read only")
+        _mutated(self)
         if self._messages is _Unknown:
-            self.__dict__['_messages'] = self._parent._create_child(self._key)
+            self._set_attribute('_messages', self._parent._create_child(self._key))
         self._messages.clear()
         self._cache.clear()
         for key, value in kwargs.items():
@@ -361,9 +444,10 @@ class MapMessage:
     def __setitem__(self, key, message):
         if self._readOnly:
             raise ValueError(f"{self._readOnly} is read only")
+        _mutated(self)
         key = self._validate_key(key)
         if self._messages is _Unknown:
-            self._messages = self._parent._create_child(self._key)
+            self._set_attribute('_messages', self._parent._create_child(self._key))
         if isinstance(message, Message):
             message = message._message
         elif isinstance(message, (MapMessage, RepeatedMessage)):
@@ -386,6 +470,7 @@ class MapMessage:
     def __delitem__(self, key):
         if self._readOnly:
             raise ValueError(f"{self._readOnly} is read only")
+        _mutated(self)
         key = self._validate_key(key)
         if self._messages is not _Unknown:
             if key in self._messages:
@@ -403,6 +488,8 @@ class MapMessage:
 
 
 class RepeatedMessage:
+    __slots__ = ('_parent', '_key', '_field', '_messages', '_readOnly', '_cache', '_digested', '_mutations', '__weakref__')
+
     def __init__(self, parent, key, field, messages=_Unknown, readOnly=False):
         self._parent = parent
         self._key = key
@@ -410,6 +497,8 @@ class RepeatedMessage:
         self._messages = messages
         self._readOnly = readOnly
         self._cache = {}
+        self._digested = None
+        self._mutations = None if readOnly else _Mutations() if parent is None else parent._mutations
 
     def __getitem__(self, key):
         key = self._validate_key(key)
@@ -427,8 +516,12 @@ class RepeatedMessage:
                     key = len(self._messages) + key
                     if key < 0:
                         key = 0
-            if key in self._cache:
-                return self._cache[key]
+            value = self._cache.get(key)
+            if value is not None:
+                if type(value) is weakref.ref:
+                    value = value()
+                if value is not None:
+                    return value
             if self._messages is _Unknown or key >= len(self._messages):
                 value = _Unknown
             else:
@@ -442,7 +535,7 @@ class RepeatedMessage:
                 value = Message(self, key, self._field.message_type, value, self._readOnly)
         else:
             value = FieldMessage(self, key, self._field.type, value)
-        self._cache[key] = value
+        self._cache[key] = weakref.ref(value) if WEAK_CACHES and self._readOnly and isinstance(value, FieldMessage) else value
         return value
 
     def __bool__(self):
@@ -465,7 +558,10 @@ class RepeatedMessage:
 
     def __hash__(self):
         if self._messages is not _Unknown:
-            return hash(tuple(hash(item) for item in self))
+            digest = self._digest()
+            if digest is not None:
+                return _digestHash(digest)
+            return _structuralHash(self)
         return 0
 
     def __eq__(self, other):
@@ -480,6 +576,9 @@ class RepeatedMessage:
             return other._messages is _Unknown
         elif other._messages is _Unknown:
             return False
+        equal = _digestEqual(self, other)
+        if equal is not None:
+            return equal
         if len(self) != len(other):
             return False
         for ix, value in enumerate(self):
@@ -487,31 +586,40 @@ class RepeatedMessage:
                 return False
         return True
 
+    def _digest(self):
+        return _digest(self, lambda: _encodeRepeated(self._field, self._messages))
+
     def __str__(self):
         return format(self)
 
     def __format__(self, spec='yaml'):
         return _formatObject(self, spec)
 
+    def _path(self, key=None):
+        return _wrapperPath(self, key)
+
     def _fullName(self, key=None):
-        if self._key is not None:
-            if self._parent is not None:
-                name = self._parent._fullName(self._key)
+        return _formatPath(self._path(key))
+
+    def _toNative(self, unknown=UNKNOWN):
+        if self._messages is _Unknown:
+            return None
+        native = []
+        for ix, message in enumerate(self._messages):
+            value = _cachedChild(self, ix)
+            if value is not None:
+                native.append(value._toNative(unknown))
             else:
-                name = str(self._key)
-            if key is not None:
-                name += f"[{key}]"
-            return name
-        if key is not None:
-            return str(key)
-        return ''
+                native.append(_nativeElement(self._field, message, unknown))
+        return native
 
     def _create_child(self, key):
         if self._readOnly:
             raise ValueError(f"{self._readOnly} is read only")
+        _mutated(self)
         key = self._validate_key(key)
         if self._messages is _Unknown:
-            self.__dict__['_messages'] = self._parent._create_child(self._key)
+            self._messages = self._parent._create_child(self._key)
         if key == append:
             key = len(self._messages)
         elif key < 0:
@@ -523,8 +631,9 @@ class RepeatedMessage:
     def __call__(self, *args):
         if self._readOnly:
             raise ValueError(f"{self._readOnly} is read only")
+        _mutated(self)
         if self._messages is _Unknown:
-            self.__dict__['_messages'] = self._parent._create_child(self._key)
+            self._messages = self._parent._create_child(self._key)
         self._messages.clear()
         self._cache.clear()
         for arg in args:
@@ -534,6 +643,7 @@ class RepeatedMessage:
     def __setitem__(self, key, message):
         if self._readOnly:
             raise ValueError(f"{self._readOnly} is read only")
+        _mutated(self)
         key = self._validate_key(key)
         if self._messages is _Unknown:
             self._messages = self._parent._create_child(self._key)
@@ -563,6 +673,7 @@ class RepeatedMessage:
     def __delitem__(self, key):
         if self._readOnly:
             raise ValueError(f"{self._readOnly} is read only")
+        _mutated(self)
         key = self._validate_key(key)
         if self._messages is not _Unknown:
             del self._messages[key]
@@ -571,6 +682,7 @@ class RepeatedMessage:
     def append(self, message=_Unknown):
         if self._readOnly:
             raise ValueError(f"{self._readOnly} is read only")
+        _mutated(self)
         if self._messages is _Unknown:
             self._messages = self._parent._create_child(self._key)
         if message is _Unknown:
@@ -590,6 +702,8 @@ class RepeatedMessage:
 
 
 class FieldMessage:
+    __slots__ = ('_parent', '_key', '_kind', '_value', '__weakref__')
+
     def __init__(self, parent, key, kind, value):
         self._parent = parent
         self._key = key
@@ -650,51 +764,59 @@ class FieldMessage:
             return None
         return float(self._value)
 
+    def _toNative(self, unknown=UNKNOWN):
+        if self._value is _Unknown:
+            return unknown
+        return self._value
+
+    def _path(self, key=None):
+        return _wrapperPath(self, key)
+
     def _fullName(self, key=None):
-        if self._key is not None:
-            if self._parent is not None:
-                name = self._parent._fullName(self._key)
-            else:
-                name = str(self._key)
-            if key is not None:
-                if '.' in key:
-                    name += f"[{key}]"
-                else:
-                    name += f".{key}"
-            return name
-        if key is not None:
-            return str(key)
-        return ''
+        return _formatPath(self._path(key))
 
 
 class ProtobufValue:
+    __slots__ = ()
+
     @property
     def _protobuf_value(self):
         return None
 
 
 class Value:
+    __slots__ = ('_parent', '_key', '_value', '_readOnly', '_dependencies', '_unknowns', '_cache', '_digested', '_tracked', '_mutations', '__weakref__')
+
     def __init__(self, parent, key, value=_Unknown, readOnly=None):
-        self._set_attribute('_parent', parent)
-        self._set_attribute('_key', key)
-        self._set_attribute('_dependencies', {})
-        self._set_attribute('_unknowns', {})
-        self._set_attribute('_cache', {})
-        self._set_attribute('_readOnly', None)
+        # Called for every value read, so the slots are set without a method call each
+        set_attribute = object.__setattr__
+        set_attribute(self, '_parent', parent)
+        set_attribute(self, '_key', key)
+        # Created when first needed, most values never have dependencies, unknowns, or children
+        set_attribute(self, '_dependencies', None)
+        set_attribute(self, '_unknowns', None)
+        set_attribute(self, '_cache', None)
+        set_attribute(self, '_tracked', None)
+        set_attribute(self, '_digested', None)
+        # Shared by the whole tree, so writes count their mutations without climbing to the root
+        set_attribute(self, '_mutations', None if readOnly else _Mutations() if parent is None else parent._mutations)
         if isinstance(value, (google.protobuf.struct_pb2.Value, google.protobuf.struct_pb2.Struct, google.protobuf.struct_pb2.ListValue)) or value is _Unknown:
-            self._set_attribute('_value', value)
+            set_attribute(self, '_value', value)
         else:
+            set_attribute(self, '_readOnly', None)
             self._set_attribute('_value', google.protobuf.struct_pb2.Value())
             if value is None:
                 self._value.null_value = 0
             elif isinstance(value, dict):
-                self._value.struct_value.Clear()
-                for k, v in value.items():
-                    self[k] = v
+                if not _setNative(self._value, value):
+                    self._value.struct_value.Clear()
+                    for k, v in value.items():
+                        self[k] = v
             elif isinstance(value, (tuple, list)):
-                self._value.list_value.Clear()
-                for ix, v in enumerate(value):
-                    self[ix] = v
+                if not _setNative(self._value, value):
+                    self._value.list_value.Clear()
+                    for ix, v in enumerate(value):
+                        self[ix] = v
             elif isinstance(value, bool): # Must be before number check
                 self._value.bool_value = value
             elif isinstance(value, (int, float)):
@@ -703,10 +825,10 @@ class Value:
                 self._value.string_value = value
             else:
                 raise ValueError(f"Unexpected Value type: {value.__class__}")
-        self._set_attribute('_readOnly', readOnly)
+        set_attribute(self, '_readOnly', readOnly)
 
     def _set_attribute(self, key, value):
-        self.__dict__[key] = value
+        object.__setattr__(self, key, value)
 
     def __enter__(self):
         return self
@@ -724,11 +846,16 @@ class Value:
         return self[key]
 
     def __getitem__(self, key):
-        key = self._validate_key(key)
+        if type(key) is not str:
+            key = self._validate_key(key)
         if key != append:
-            if key in self._cache:
-                return self._cache[key]
-            if key in self._unknowns:
+            value = self._cache.get(key) if self._cache else None
+            if value is not None:
+                if type(value) is weakref.ref:
+                    value = value()
+                if value is not None:
+                    return value
+            if self._unknowns and key in self._unknowns:
                 return self._unknowns[key]
         if isinstance(key, str):
             match self._kind:
@@ -771,7 +898,11 @@ class Value:
         else:
             raise NotImplementedError()
         value = Value(self, key, value, self._readOnly)
-        self._cache[key] = value
+        cache = self._cache
+        if cache is None:
+            cache = {}
+            self._set_attribute('_cache', cache)
+        cache[key] = weakref.ref(value) if WEAK_CACHES and self._readOnly and value._kind not in ('struct_value', 'list_value') else value
         return value
 
     def __bool__(self):
@@ -780,13 +911,13 @@ class Value:
     def __len__(self):
         match self._kind:
             case 'struct_value':
-                return len(self._value.struct_value.fields) + len(self._unknowns)
+                return len(self._value.struct_value.fields) + (len(self._unknowns) if self._unknowns else 0)
             case 'Struct':
-                return len(self._value.fields) + len(self._unknowns)
+                return len(self._value.fields) + (len(self._unknowns) if self._unknowns else 0)
             case 'list_value':
-                return len(self._value.list_value.values) + len(self._unknowns)
+                return len(self._value.list_value.values) + (len(self._unknowns) if self._unknowns else 0)
             case 'ListValue':
-                return len(self._value.values) + len(self._unknowns)
+                return len(self._value.values) + (len(self._unknowns) if self._unknowns else 0)
             case 'string_value':
                 return len(self._value.string_value)
             case 'bool_value':
@@ -797,10 +928,10 @@ class Value:
         match self._kind:
             case 'struct_value':
                 item = self._validate_key(item)
-                return item in self._value.struct_value.fields or item in self._unknowns
+                return item in self._value.struct_value.fields or bool(self._unknowns and item in self._unknowns)
             case 'Struct':
                 item = self._validate_key(item)
-                return item in self._value.fields or item in self._unknowns
+                return item in self._value.fields or bool(self._unknowns and item in self._unknowns)
             case 'list_value' | 'ListValue':
                 for value in self:
                     if item == value:
@@ -810,30 +941,36 @@ class Value:
     def __iter__(self):
         match self._kind:
             case 'struct_value':
-                for key in sorted(set(self._value.struct_value.fields) | set(self._unknowns.keys())):
+                for key in sorted(set(self._value.struct_value.fields) | set(self._unknowns or ())):
                     yield key, self[key]
             case 'Struct':
-                for key in sorted(set(self._value.fields) | set(self._unknowns.keys())):
+                for key in sorted(set(self._value.fields) | set(self._unknowns or ())):
                     yield key, self[key]
             case 'list_value':
                 for ix in range(len(self._value.list_value.values)):
                     yield self[ix]
-                for ix in sorted(self._unknowns.keys()):
+                for ix in sorted(self._unknowns or ()):
                     if ix >= len(self._value.list_value.values):
                         yield self[ix]
             case 'ListValue':
                 for ix in range(len(self._value.values)):
                     yield self[ix]
-                for ix in sorted(self._unknowns.keys()):
+                for ix in sorted(self._unknowns or ()):
                     if ix >= len(self._value.values):
                         yield self[ix]
 
     def __hash__(self):
         match self._kind:
             case 'struct_value' | 'Struct':
-                return hash(tuple(hash(item) for item in sorted(iter(self), key=lambda item: item[0])))
+                digest = self._digest()
+                if digest is not None:
+                    return _digestHash(digest)
+                return _structuralHash(self)
             case 'list_value' | 'ListValue':
-                return hash(tuple(hash(item) for item in self))
+                digest = self._digest()
+                if digest is not None:
+                    return _digestHash(digest)
+                return _structuralHash(self)
             case 'string_value':
                 return hash(self._value.string_value)
             case 'null_value':
@@ -852,6 +989,10 @@ class Value:
             case 'struct_value' | 'Struct':
                 if not isinstance(other, (Value, dict)):
                     return False
+                if isinstance(other, Value):
+                    equal = _digestEqual(self, other)
+                    if equal is not None:
+                        return equal
                 if len(self) != len(other):
                     return False
                 for key, value in self:
@@ -863,6 +1004,10 @@ class Value:
             case 'list_value' | 'ListValue':
                 if not isinstance(other, (Value, tuple, list)):
                     return False
+                if isinstance(other, Value):
+                    equal = _digestEqual(self, other)
+                    if equal is not None:
+                        return equal
                 if len(self) != len(other):
                     return False
                 for ix, value in enumerate(self):
@@ -897,6 +1042,9 @@ class Value:
                 return False
         return False
 
+    def _digest(self):
+        return _digest(self, lambda: _encodeStruct(self._raw))
+
     def __str__(self):
         return format(self, '')
 
@@ -944,40 +1092,22 @@ class Value:
                 return 0.0
         raise TypeError(f"Cannot convert kind to float: {kind}")
 
+    def _path(self, key=None):
+        if isinstance(key, str) and not self._isMap:
+            key = _DottedKey(key)
+        return _wrapperPath(self, key)
+
     def _fullName(self, key=None):
-        if self._key is not None:
-            if self._parent is not None:
-                name = self._parent._fullName(self._key)
-            else:
-                name = str(self._key)
-            if key is not None:
-                if self._isMap:
-                    if key.isidentifier():
-                        name += f".{key}"
-                    else:
-                        name += f"['{key}']"
-                elif self._isList:
-                    name += f"[{key}]"
-                else:
-                    if isinstance(key, int):
-                        name += f"[{key}]"
-                    else:
-                        if '.' in key:
-                            name += f"[{key}]"
-                        else:
-                            name += f".{key}"
-            return name
-        if key is not None:
-            return str(key)
-        return ''
+        return _formatPath(self._path(key))
 
     def __call__(self, *args, **kwargs):
         if self._readOnly:
             raise ValueError(f"{self._readOnly} is read only")
-        self.__dict__['_value'] = google.protobuf.struct_pb2.Value()
-        self._cache.clear()
-        self._dependencies.clear()
-        self._unknowns.clear()
+        _mutated(self)
+        self._set_attribute('_value', google.protobuf.struct_pb2.Value())
+        self._set_attribute('_cache', None)
+        self._set_attribute('_dependencies', None)
+        self._set_attribute('_unknowns', None)
         if len(kwargs):
             if len(args):
                 raise ValueError('Connect specify both kwargs and args')
@@ -996,6 +1126,7 @@ class Value:
     def __setitem__(self, key, value):
         if self._readOnly:
             raise ValueError(f"{self._readOnly} is read only")
+        _mutated(self)
         key = self._validate_key(key)
         if isinstance(key, str):
             if self._ensure_map() == 'struct_value':
@@ -1015,9 +1146,7 @@ class Value:
                 values.add()
         else:
             raise NotImplementedError()
-        self._cache.pop(key, None)
-        self._dependencies.pop(key, None)
-        self._unknowns.pop(key, None)
+        self._discard(key)
         if isinstance(value, ProtobufValue):
             value = value._protobuf_value
         if value is None:
@@ -1031,15 +1160,17 @@ class Value:
         elif isinstance(value, (int, float)):
             values[key].number_value = value
         elif isinstance(value, dict):
-            values[key].struct_value.Clear()
-            for k, v in value.items():
-                self[key][k] = v
+            if not _setNative(values[key], value):
+                values[key].struct_value.Clear()
+                for k, v in value.items():
+                    self[key][k] = v
         elif isinstance(value, (list, tuple)):
-            values[key].list_value.Clear()
-            for ix, v in enumerate(value):
-                self[key][ix] = v
+            if not _setNative(values[key], value):
+                values[key].list_value.Clear()
+                for ix, v in enumerate(value):
+                    self[key][ix] = v
         elif isinstance(value, FieldMessage):
-            self._dependencies[key] = value
+            self._ensure_dict('_dependencies')[key] = value
             if isinstance(value._value, str):
                 values[key].string_value = value._value
             elif isinstance(value._value, bytes):
@@ -1055,16 +1186,23 @@ class Value:
             else:
                 raise ValueError(f"Unexpected field type: {value._value.__class__}")
         elif isinstance(value, Value):
-            self._dependencies[key] = value
+            self._ensure_dict('_dependencies')[key] = value
             match value._kind:
                 case 'struct_value' | 'Struct':
-                    values[key].struct_value.Clear()
-                    for k, v in value:
-                        self[key][k] = v
+                    # Unknowns are not in the protobuf, only those subtrees are assigned value by value
+                    if _holdsUnknowns(value):
+                        values[key].struct_value.Clear()
+                        for k, v in value:
+                            self[key][k] = v
+                    else:
+                        values[key].struct_value.CopyFrom(value._raw)
                 case 'list_value' | 'ListValue':
-                    values[key].list_value.Clear()
-                    for ix, v in enumerate(value):
-                        self[key][ix] = v
+                    if _holdsUnknowns(value):
+                        values[key].list_value.Clear()
+                        for ix, v in enumerate(value):
+                            self[key][ix] = v
+                    else:
+                        values[key].list_value.CopyFrom(value._raw)
                 case 'string_value':
                     values[key].string_value = value._value.string_value
                 case 'null_value':
@@ -1101,8 +1239,9 @@ class Value:
                 return _Unknown
 
     def _setUnknown(self, key, value):
-        self._dependencies.pop(key, None)
-        self._unknowns[key] = value
+        if self._dependencies:
+            self._dependencies.pop(key, None)
+        self._ensure_dict('_unknowns')[key] = value
         match self._kind:
             case 'struct_value':
                 if key in self._value.struct_value.fields:
@@ -1131,6 +1270,7 @@ class Value:
     def __delitem__(self, key):
         if self._readOnly:
             raise ValueError(f"{self._readOnly} is read only")
+        _mutated(self)
         kind = self._kind
         if kind == 'Unknown':
             return
@@ -1145,9 +1285,7 @@ class Value:
                         del self._value[key]
                 case _:
                     raise ValueError(f"Invalid key \"{key}\" for kind: {self._kind}")
-            self._cache.pop(key, None)
-            self._dependencies.pop(key, None)
-            self._unknowns.pop(key, None)
+            self._discard(key)
         elif isinstance(key, int):
             match kind:
                 case 'list_value':
@@ -1158,21 +1296,21 @@ class Value:
                     raise ValueError(f"Invalid key \"{key}\" for kind: {self._kind}")
             if key < len(values.values):
                 del values[key]
-            self._cache.pop(key, None)
-            self._dependencies.pop(key, None)
-            self._unknowns.pop(key, None)
-            for ix in sorted(self._dependencies.keys()):
+            self._discard(key)
+            for ix in sorted(self._dependencies or ()):
                 if ix > key:
-                    self._cache.pop(ix, None)
-                    self._dependencies[ix - 1] = self._dependences[ix]
+                    if self._cache:
+                        self._cache.pop(ix, None)
+                    self._dependencies[ix - 1] = self._dependencies[ix]
                     del self._dependencies[ix]
-            for ix in sorted(self._unknowns.keys()):
+            for ix in sorted(self._unknowns or ()):
                 if ix > key:
-                    self._cache.pop(ix, None)
+                    if self._cache:
+                        self._cache.pop(ix, None)
                     self._unknowns[ix - 1] = self._unknowns[ix]
                     del self._unknowns[ix]
             for ix in reversed(range(len(values.values))):
-                if ix not in self._unknowns:
+                if not self._unknowns or ix not in self._unknowns:
                     break
                 del values[ix]
         else:
@@ -1181,6 +1319,7 @@ class Value:
     def _create_child(self, key):
         if self._readOnly:
             raise ValueError(f"{self._readOnly} is read only")
+        _mutated(self)
         key = self._validate_key(key)
         if isinstance(key, str):
             if self._ensure_map() == 'struct_value':
@@ -1213,13 +1352,74 @@ class Value:
             raise TypeError(f"Unexpected key type: {key.__class__}")
         return key
 
+    def _ensure_dict(self, name):
+        values = getattr(self, name)
+        if values is None:
+            values = {}
+            self._set_attribute(name, values)
+            if name != '_cache':
+                self._track()
+        return values
+
+    def _track(self):
+        # Record this value with its root, so dependencies and unknowns are found without walking the tree
+        node = self
+        while isinstance(node._parent, Value):
+            node = node._parent
+        if node._tracked is None:
+            node._set_attribute('_tracked', {})
+        node._tracked[id(self)] = self
+
+    def _trackedValues(self):
+        # The tracked values at or below this value, with their keys from this value
+        root = self
+        while isinstance(root._parent, Value):
+            root = root._parent
+        if not root._tracked:
+            return []
+        values = []
+        for id, value in list(root._tracked.items()):
+            keys = []
+            node = value
+            while node is not self and node is not root:
+                parent = node._parent
+                if not isinstance(parent, Value) or not parent._cache or parent._cache.get(node._key) is not node:
+                    # No longer in the tree, a parent was reset or the key replaced
+                    del root._tracked[id]
+                    break
+                keys.append(node._key)
+                node = parent
+            else:
+                if node is self:
+                    keys.reverse()
+                    values.append((tuple(keys), value))
+        return values
+
+    def _orderedTrackedValues(self):
+        # In tree order, parents before their children
+        return sorted(self._trackedValues(), key=lambda entry: tuple((isinstance(key, int), key) for key in entry[0]))
+
+    def _trackedChild(self, keys):
+        # The tracked value at keys, None if it is no longer in the tree
+        node = self
+        for key in keys:
+            node = node._cache.get(key) if node._cache else None
+            if node is None:
+                return None
+        return node
+
+    def _discard(self, key):
+        for values in (self._cache, self._dependencies, self._unknowns):
+            if values:
+                values.pop(key, None)
+
     def _ensure_map(self):
         kind = self._kind
         if kind == 'Unknown':
             if self._parent is None:
-                self.__dict__['_value'] = google.protobuf.struct_pb2.Value()
+                self._set_attribute('_value', google.protobuf.struct_pb2.Value())
             else:
-                self.__dict__['_value'] = self._parent._create_child(self._key)
+                self._set_attribute('_value', self._parent._create_child(self._key))
             if isinstance(self._value, google.protobuf.struct_pb2.Value) and self._value.WhichOneof('kind') is None:
                 self._value.struct_value.Clear()
             kind = self._kind
@@ -1231,9 +1431,9 @@ class Value:
         kind = self._kind
         if kind == 'Unknown':
             if self._parent is None:
-                self.__dict__['_value'] = google.protobuf.struct_pb2.Value()
+                self._set_attribute('_value', google.protobuf.struct_pb2.Value())
             else:
-                self.__dict__['_value'] = self._parent._create_child(self._key)
+                self._set_attribute('_value', self._parent._create_child(self._key))
             if isinstance(self._value, google.protobuf.struct_pb2.Value) and self._value.WhichOneof('kind') is None:
                 self._value.list_value.Clear()
             kind = self._kind
@@ -1267,72 +1467,729 @@ class Value:
 
     @property
     def _getUnknowns(self):
+        return {_formatPath(destination): _formatPath(source) for destination, source in self._getUnknownPaths.items()}
+
+    @property
+    def _getDependencies(self):
+        return {_formatPath(destination): _formatPath(source) for destination, source in self._getDependencyPaths.items()}
+
+    @property
+    def _getUnknownPaths(self):
         unknowns = {}
-        for key, unknown in self._unknowns.items():
-            unknowns[self._fullName(key)] = unknown._fullName()
-        if self._isMap:
-            for key, value in self:
-                if isinstance(value, Value):
-                    unknowns.update(value._getUnknowns)
-        elif self._isList:
-            for value in self:
-                if isinstance(value, Value):
-                    unknowns.update(value._getUnknowns)
+        for keys, value in self._orderedTrackedValues():
+            for key, unknown in (value._unknowns or {}).items():
+                unknowns[value._path(key)] = unknown._path()
         return unknowns
 
     @property
-    def _getDependencies(self):
+    def _getDependencyPaths(self):
         dependencies = {}
-        for key, dependency in self._dependencies.items():
-            dependencies[self._fullName(key)] = dependency._fullName()
-        for key, unknown in self._unknowns.items():
-            dependencies[self._fullName(key)] = unknown._fullName()
-        if self._isMap:
-            for key, value in self:
-                if isinstance(value, Value):
-                    dependencies.update(value._getDependencies)
-        elif self._isList:
-            for value in self:
-                if isinstance(value, Value):
-                    dependencies.update(value._getDependencies)
+        for keys, value in self._orderedTrackedValues():
+            for key, dependency in (value._dependencies or {}).items():
+                dependencies[value._path(key)] = dependency._path()
+            for key, unknown in (value._unknowns or {}).items():
+                dependencies[value._path(key)] = unknown._path()
         return dependencies
 
     def _patchUnknowns(self, patches):
-        for key in list(self._unknowns.keys()):
-            self[key] = patches[key]
-        if self._isMap:
-            for key, value in self:
-                if isinstance(value, Value) and len(value):
-                    patch = patches[key]
-                    if isinstance(patch, Value) and patch._kind == value._kind and len(patch):
-                        value._patchUnknowns(patch)
-        elif self._isList:
-            for ix, value in enumerate(self):
-                if isinstance(value, Value) and len(value):
-                    patch = patches[ix]
-                    if isinstance(patch, Value) and patch._kind == value._kind and len(patch):
-                        value._patchUnknowns(patch)
-
-    def _renderUnknowns(self, trimFullName):
-        for key, unknown in list(self._unknowns.items()):
-            self[key] = f"UNKNOWN:{trimFullName(unknown._fullName())}"
-            self._dependencies[key] = unknown
-        if self._isMap:
-            for key, value in self:
-                if isinstance(value, Value) and len(value):
-                    value._renderUnknowns(trimFullName)
-        elif self._isList:
-            for ix, value in enumerate(self):
-                if isinstance(value, Value) and len(value):
-                    value._renderUnknowns(trimFullName)
+        for keys, value in self._orderedTrackedValues():
+            if not value._unknowns:
+                continue
+            # Only values whose parents are not empty and match the patch parents are patched
+            node = self
+            patch = patches
+            for key in keys:
+                node = node._cache.get(key) if node._cache else None
+                if node is None or not len(node):
+                    break
+                patch = patch[key]
+                if not isinstance(patch, Value) or patch._kind != node._kind or not len(patch):
+                    break
+            else:
+                if node is value:
+                    for key in list(value._unknowns or ()):
+                        value[key] = patch[key]
+
+    def _renderUnknowns(self, trimPath):
+        for keys, value in self._orderedTrackedValues():
+            if not value._unknowns:
+                continue
+            node = self
+            for key in keys:
+                node = node._cache.get(key) if node._cache else None
+                if node is None or not len(node):
+                    break
+            else:
+                if node is value:
+                    for key, unknown in list(value._unknowns.items()):
+                        value[key] = f"UNKNOWN:{trimPath(unknown._path())}"
+                        value._ensure_dict('_dependencies')[key] = unknown
+
+    def _toNative(self, unknown=UNKNOWN):
+        """Convert to Python dicts, lists, and scalars without wrapping every node.
+
+        Maps have sorted keys, numbers that are integers are ints, and unknowns are unknown.
+        """
+        kind = self._kind
+        match kind:
+            case 'struct_value' | 'Struct':
+                struct = self._value.struct_value if kind == 'struct_value' else self._value
+                if not self._cache and not self._unknowns:
+                    return _nativeStruct(struct, unknown)
+                # Wrappers already created may have unknowns of their own
+                native = {}
+                fields = struct.fields
+                for key in sorted(set(fields) | set(self._unknowns or ())):
+                    value = _cachedChild(self, key)
+                    if value is None and self._unknowns:
+                        value = self._unknowns.get(key)
+                    if value is not None:
+                        native[key] = value._toNative(unknown)
+                    else:
+                        native[key] = _nativeValue(fields[key], unknown)
+                return native
+            case 'list_value' | 'ListValue':
+                values = (self._value.list_value if kind == 'list_value' else self._value).values
+                if not self._cache and not self._unknowns:
+                    return [_nativeValue(value, unknown) for value in values]
+                native = []
+                for ix in range(len(values)):
+                    value = _cachedChild(self, ix)
+                    if value is None and self._unknowns:
+                        value = self._unknowns.get(ix)
+                    if value is not None:
+                        native.append(value._toNative(unknown))
+                    else:
+                        native.append(_nativeValue(values[ix], unknown))
+                for ix in sorted(self._unknowns or ()):
+                    if ix >= len(values):
+                        native.append(unknown)
+                return native
+            case 'Unknown':
+                return unknown
+        return _nativeValue(self._value, unknown)
+
+
+class _DottedKey(str):
+    # A key formatted as .key, or as [key] when it contains a dot, as protobuf map keys are
+    __slots__ = ()
+
+
+def _wrapperPath(wrapper, key):
+    if wrapper._key is not None:
+        if wrapper._parent is not None:
+            path = wrapper._parent._path(wrapper._key)
+        else:
+            path = (wrapper._key,)
+        return path if key is None else path + (key,)
+    return () if key is None else (key,)
+
+
+def _formatPath(path):
+    """Format a path tuple from _path() as _fullName() does, for example spec.tags[0]."""
+    name = ''
+    for ix, key in enumerate(path):
+        if not ix:
+            name = str(key)
+        elif isinstance(key, int):
+            name += f"[{key}]"
+        elif type(key) is _DottedKey:
+            name += f"[{key}]" if '.' in key else f".{key}"
+        elif key.isidentifier():
+            name += f".{key}"
+        else:
+            name += f"['{key}']"
+    return name
+
+
+class _Mutations:
+    """Counts the writes to a tree of writable wrappers, every wrapper of the tree shares one."""
+    __slots__ = ('count',)
+
+    def __init__(self):
+        self.count = 0
+
+
+def _mutated(wrapper):
+    # Counts the writes to the tree of the wrapper, its digests are only reused until the next write
+    wrapper._mutations.count += 1
+
+
+def _digest(wrapper, encode):
+    # A digest of the normalized encoding of the protobuf, used for fast equality and hashing.
+    # None if wrappers below hold unknowns that are not in the protobuf, or it holds a NaN.
+    digested = wrapper._digested
+    if wrapper._readOnly:
+        if digested is not None:
+            return digested[1]
+        mutations = None
+    else:
+        mutations = wrapper._mutations.count
+        if digested is not None and digested[0] == mutations:
+            return digested[1]
+    if _holdsUnknowns(wrapper):
+        digest = None
+    else:
+        try:
+            digest = hashlib.blake2b(encode(), digest_size=16).digest()
+        except _NotANumber:
+            digest = None
+    object.__setattr__(wrapper, '_digested', (mutations, digest))
+    return digest
+
+
+class _NotANumber(Exception):
+    """NaN is not equal to itself, so values that may hold one are compared field by field."""
+
+
+# The encodings are normalized so equal digests agree with ==, as == ignores message field presence
+# and -0.0 == 0.0. Parts are prefixed with their length or count so their concatenation is unambiguous.
+
+def _encodePart(data):
+    return b'%d:%s' % (len(data), data)
+
+
+def _encodeNumber(number):
+    if number != number:
+        raise _NotANumber()
+    # Adding 0.0 turns -0.0 into 0.0
+    return repr(number + 0.0).encode()
+
+
+# Serialized -0.0 and 0.0 number values, UTF-8 strings cannot contain a 0x00 byte followed by 0x80
+_NEGATIVE_ZERO = b'\x11\x00\x00\x00\x00\x00\x00\x00\x80'
+_ZERO = b'\x11\x00\x00\x00\x00\x00\x00\x00\x00'
+# A serialized number value with all exponent bits set, a NaN or an infinity
+_NOT_FINITE = re.compile(rb'\x11[\x00-\xff]{6}[\xf0-\xff][\x7f\xff]')
+
+def _encodeStruct(message):
+    # A Struct, ListValue, or Value, these are digested in bulk so are serialized instead of walked
+    data = message.SerializeToString(deterministic=True).replace(_NEGATIVE_ZERO, _ZERO)
+    if _NOT_FINITE.search(data):
+        raise _NotANumber()
+    return data
+
+
+def _encodeMessage(message):
+    # Empty when every field is unset or empty, as == does not distinguish them
+    name = message.DESCRIPTOR.full_name
+    if name == 'google.protobuf.Struct':
+        return _encodeStruct(message) if message.fields else b''
+    if name == 'google.protobuf.ListValue':
+        return _encodeStruct(message) if message.values else b''
+    parts = []
+    for field, value in message.ListFields():
+        if field.is_repeated:
+            if field.type == field.TYPE_MESSAGE and field.message_type.GetOptions().map_entry:
+                encoded = _encodeMap(field.message_type.fields_by_name['value'], value)
+            else:
+                encoded = _encodeRepeated(field, value)
+        else:
+            encoded = _encodeElement(field, value)
+            if not encoded or (field.type != field.TYPE_MESSAGE and value == field.default_value):
+                continue
+        parts.append(_encodePart(field.name.encode()) + _encodePart(encoded))
+    return b''.join(parts)
+
+
+def _encodeMap(field, messages):
+    return b'%d:%s' % (len(messages), b''.join(
+        _encodePart(repr(key).encode()) + _encodePart(_encodeElement(field, messages[key])) for key in sorted(messages)
+    ))
+
+
+def _encodeRepeated(field, messages):
+    return b'%d:%s' % (len(messages), b''.join(_encodePart(_encodeElement(field, message)) for message in messages))
+
+
+def _encodeElement(field, value):
+    if field.type == field.TYPE_MESSAGE:
+        return _encodeMessage(value)
+    if field.type in (field.TYPE_DOUBLE, field.TYPE_FLOAT):
+        return _encodeNumber(value)
+    return repr(value).encode()
+
+
+def _digestEqual(wrapper, other):
+    # Whether the digests are equal, None if either has no digest
+    digest = wrapper._digest()
+    if digest is not None:
+        otherDigest = other._digest()
+        if otherDigest is not None:
+            return digest == otherDigest
+    return None
+
+
+def _digestHash(digest):
+    return int.from_bytes(digest[:8], 'little', signed=True)
+
+
+def _structuralHash(wrapper):
+    # Used when there is no digest, so == compares field by field. The children are hashed
+    # the same way, their own digests could disagree with that comparison.
+    if isinstance(wrapper, (Message, MapMessage)) or (isinstance(wrapper, Value) and wrapper._isMap):
+        return hash(tuple((key, _structuralHash(value)) for key, value in wrapper))
+    if isinstance(wrapper, RepeatedMessage) or (isinstance(wrapper, Value) and wrapper._isList):
+        return hash(tuple(_structuralHash(value) for value in wrapper))
+    return hash(wrapper)
+
+
+def _holdsUnknowns(wrapper):
+    if isinstance(wrapper, FieldMessage) or wrapper._readOnly:
+        return False
+    if isinstance(wrapper, Value):
+        return any(value._unknowns for keys, value in wrapper._trackedValues())
+    return any(_holdsUnknowns(child) for child in wrapper._cache.values())
+
+
+def _cachedChild(wrapper, key):
+    # Read only wrappers may hold their scalar children weakly, see WEAK_CACHES
+    child = wrapper._cache.get(key) if wrapper._cache else None
+    if type(child) is weakref.ref:
+        child = child()
+    return child
+
+
+def _nativeValue(value, unknown):
+    kind = value.WhichOneof('kind')
+    if kind == 'string_value':
+        return value.string_value
+    if kind == 'struct_value':
+        return _nativeStruct(value.struct_value, unknown)
+    if kind == 'number_value':
+        number = value.number_value
+        return int(number) if number.is_integer() else number
+    if kind == 'list_value':
+        return [_nativeValue(item, unknown) for item in value.list_value.values]
+    if kind == 'bool_value':
+        return value.bool_value
+    if kind == 'null_value':
+        return None
+    return unknown
+
+
+def _nativeStruct(struct, unknown):
+    fields = struct.fields
+    return {key: _nativeValue(fields[key], unknown) for key in sorted(fields)}
+
+
+def _nativeField(field, value, unknown):
+    if field.is_repeated:
+        if field.type == field.TYPE_MESSAGE and field.message_type.GetOptions().map_entry:
+            entry = field.message_type.fields_by_name['value']
+            return {key: _nativeElement(entry, value[key], unknown) for key in sorted(value)}
+        return [_nativeElement(field, item, unknown) for item in value]
+    return _nativeElement(field, value, unknown)
+
+
+def _nativeElement(field, value, unknown):
+    if field.type != field.TYPE_MESSAGE:
+        return value
+    match field.message_type.name:
+        case 'Struct':
+            return _nativeStruct(value, unknown)
+        case 'ListValue':
+            return [_nativeValue(item, unknown) for item in value.values]
+    native = {}
+    for key, field in sorted(field.message_type.fields_by_name.items()):
+        native[key] = _nativeField(field, getattr(value, key), unknown)
+    return native
+
+
+class Path:
+    """A compiled path of keys, for example Path('spec.forProvider.tags[0]').
+
+    Gets, sets, or tests the value at the path in one call. Below the wrappers already
+    created, the underlying protobuf is walked directly instead of creating a wrapper
+    for every key. Compiled paths are cached by the class.
+    """
+    __slots__ = ('path', 'keys')
+    _compiled = {}
+
+    def __new__(cls, path):
+        if isinstance(path, list):
+            path = tuple(path)
+        compiled = cls._compiled.get(path)
+        if compiled is None:
+            compiled = super(Path, cls).__new__(cls)
+            compiled.path = path
+            compiled.keys = _parsePath(path)
+            if len(cls._compiled) < 4096:
+                cls._compiled[path] = compiled
+        return compiled
+
+    def __repr__(self):
+        return f"Path({self.path!r})"
+
+    def get(self, target):
+        keys = self.keys
+        node, ix = self._walk(target, len(keys))
+        if ix >= len(keys) - 1 or not node._readOnly:
+            # Writable values are created through their parents, so each has only one wrapper
+            return self._slow(node, ix, len(keys))
+        value = node._value
+        for key in keys[ix:]:
+            value = _rawChild(value, key)
+            if value is None:
+                return self._slow(node, ix, len(keys))
+            if value is _Unknown:
+                break
+        return Value(_PathParent(node, keys[ix:-1]), keys[-1], value, node._readOnly)
+
+    def set(self, target, value):
+        keys = self.keys
+        node, ix = self._walk(target, len(keys) - 1)
+        if ix < len(keys) - 1 and self._setRaw(node, keys[ix:], value):
+            return
+        self._slow(node, ix, len(keys) - 1)[keys[-1]] = value
+
+    def exists(self, target):
+        keys = self.keys
+        node, ix = self._walk(target, len(keys))
+        if ix == len(keys):
+            return bool(node)
+        value = node._value
+        for key in keys[ix:]:
+            value = _rawChild(value, key)
+            if value is None:
+                return bool(self._slow(node, ix, len(keys)))
+            if value is _Unknown:
+                return False
+        return not isinstance(value, google.protobuf.struct_pb2.Value) or value.WhichOneof('kind') is not None
+
+    def _walk(self, node, count):
+        # Follow the wrappers already created, returns the deepest and the index of the next key
+        for ix in range(count):
+            key = self.keys[ix]
+            if isinstance(node, Value):
+                child = _cachedChild(node, key)
+                if child is not None:
+                    node = child
+                elif node._unknowns and key in node._unknowns:
+                    node = node._unknowns[key]
+                elif isinstance(key, str) or 0 <= key < append:
+                    return node, ix
+                else:
+                    node = node[key]
+            else:
+                node = node[key]
+        return node, count
+
+    def _slow(self, node, ix, count):
+        for key in self.keys[ix:count]:
+            node = node[key]
+        return node
+
+    def _setRaw(self, node, keys, value):
+        # Only plain values, which have no dependencies or unknowns to record, are set directly
+        if type(value) not in (str, int, float, bool, dict, list, tuple) and value is not None:
+            return False
+        if node._readOnly:
+            raise ValueError(f"{node._readOnly} is read only")
+        _mutated(node)
+        key = keys[0]
+        if isinstance(key, str):
+            struct = node._value.struct_value if node._ensure_map() == 'struct_value' else node._value
+            node._discard(key)
+            child = struct.fields[key]
+        else:
+            values = node._value.list_value if node._ensure_list() == 'list_value' else node._value
+            node._discard(key)
+            values = values.values
+            while key >= len(values):
+                values.add()
+            child = values[key]
+        for key in keys[1:]:
+            kind = child.WhichOneof('kind')
+            if isinstance(key, str):
+                if kind is None:
+                    child.struct_value.Clear()
+                elif kind != 'struct_value':
+                    return False
+                child = child.struct_value.fields[key]
+            else:
+                if kind is None:
+                    child.list_value.Clear()
+                elif kind != 'list_value' or not 0 <= key < append:
+                    return False
+                values = child.list_value.values
+                while key >= len(values):
+                    values.add()
+                child = values[key]
+        return _setNative(child, value)
+
+
+class _PathParent:
+    """Stands in for the wrappers between a read only Path result and the deepest wrapper already created."""
+    __slots__ = ('node', 'keys')
+
+    def __init__(self, node, keys):
+        self.node = node
+        self.keys = keys
+
+    def _parent(self):
+        node = self.node
+        for key in self.keys:
+            node = node[key]
+        return node
+
+    def _path(self, key=None):
+        return self._parent()._path(key)
+
+    def _fullName(self, key=None):
+        return self._parent()._fullName(key)
+
+
+def _parsePath(path):
+    if isinstance(path, tuple):
+        return path
+    keys = []
+    position = 0
+    while position < len(path):
+        match = _PATH_KEY.match(path, position)
+        if match is None or (position == 0 and match.group(0).startswith('.')):
+            raise ValueError(f"Invalid path: {path}")
+        name, index, quoted, doubleQuoted = match.groups()
+        if index is not None:
+            keys.append(int(index))
+        else:
+            keys.append(next(key for key in (name, quoted, doubleQuoted) if key is not None))
+        position = match.end()
+    if not keys:
+        raise ValueError(f"Invalid path: {path}")
+    return tuple(keys)
+
+_PATH_KEY = re.compile(r"""(?:^|\.)([^.\[\]]+)|\[(-?\d+)\]|\['([^']*)'\]|\["([^"]*)"\]""")
+
+
+def _rawChild(value, key):
+    # The protobuf child of value, _Unknown if it does not exist, or None if a wrapper must decide
+    if value is _Unknown:
+        return _Unknown
+    if isinstance(value, google.protobuf.struct_pb2.Value):
+        kind = value.WhichOneof('kind')
+        if kind == 'struct_value':
+            value = value.struct_value
+        elif kind == 'list_value':
+            value = value.list_value
+        elif kind is None:
+            return _Unknown
+        else:
+            return None
+    if isinstance(value, google.protobuf.struct_pb2.Struct):
+        if isinstance(key, str):
+            return value.fields.get(key, _Unknown)
+        return None
+    if isinstance(key, int) and 0 <= key < append:
+        if key < len(value.values):
+            return value.values[key]
+        return _Unknown
+    return None
+
+
+class Query:
+    """A compiled query over Value trees, for example Query('status.conditions[?(@.type == "Ready")].status').
+
+    JSONPath-like, keys and indexes are written as for Path, with `*` wildcards matching every
+    map value or list item and `[?(@.key op literal)]` filters selecting the items where the
+    comparison is true. Queries walk the underlying protobuf of all sources in one pass and
+    return plain Python values, missing values are skipped. Compiled queries are cached by
+    the class.
+    """
+    __slots__ = ('query', 'steps')
+    _compiled = {}
+
+    def __new__(cls, query):
+        compiled = cls._compiled.get(query)
+        if compiled is None:
+            compiled = super(Query, cls).__new__(cls)
+            compiled.query = query
+            compiled.steps = _parseQuery(query)
+            if len(cls._compiled) < 4096:
+                cls._compiled[query] = compiled
+        return compiled
+
+    def __repr__(self):
+        return f"Query({self.query!r})"
+
+    def __call__(self, sources):
+        return self.all(sources)
+
+    def all(self, sources):
+        """The values matched in sources, a Value, Resource, RequiredResource, or an iterable of them."""
+        nodes = []
+        _queryRoots(sources, nodes)
+        for step in self.steps:
+            nodes = step(nodes)
+        values = []
+        for node in nodes:
+            if isinstance(node, google.protobuf.struct_pb2.Value):
+                if node.WhichOneof('kind') is not None:
+                    values.append(_nativeValue(node, UNKNOWN))
+            elif isinstance(node, google.protobuf.struct_pb2.Struct):
+                values.append(_nativeStruct(node, UNKNOWN))
+            else:
+                values.append([_nativeValue(item, UNKNOWN) for item in node.values])
+        return values
+
+    def first(self, sources, default=None):
+        values = self.all(sources)
+        return values[0] if values else default
+
+
+def _queryRoots(sources, roots):
+    from . import composite
+    if isinstance(sources, Value):
+        if sources._value is not _Unknown:
+            roots.append(sources._value)
+    elif isinstance(sources, (google.protobuf.struct_pb2.Value, google.protobuf.struct_pb2.Struct, google.protobuf.struct_pb2.ListValue)):
+        roots.append(sources)
+    elif isinstance(sources, (Message, MapMessage, RepeatedMessage, FieldMessage, str, bytes)):
+        raise TypeError(f"Cannot query: {type(sources).__name__}")
+    elif isinstance(sources, tuple) and len(sources) == 2 and isinstance(sources[0], str):
+        # The (name, resource) pairs yielded by iterating resources and requireds
+        _queryRoots(sources[1], roots)
+    elif isinstance(sources, composite.RequiredResources):
+        roots.extend(sources._observedRaw())
+    elif isinstance(sources, (composite.Resource, composite.RequiredResource)):
+        _queryRoots(sources.observed, roots)
+    else:
+        for source in sources:
+            _queryRoots(source, roots)
+
+
+def _queryContainer(node):
+    # The Struct or ListValue of node, None if it is a scalar or does not exist
+    if isinstance(node, google.protobuf.struct_pb2.Value):
+        kind = node.WhichOneof('kind')
+        if kind == 'struct_value':
+            return node.struct_value
+        if kind == 'list_value':
+            return node.list_value
+        return None
+    return node
+
+
+def _queryChild(node, key):
+    container = _queryContainer(node)
+    if isinstance(container, google.protobuf.struct_pb2.Struct):
+        if isinstance(key, str):
+            return container.fields.get(key, _Unknown)
+    elif container is not None and isinstance(key, int):
+        values = container.values
+        if -len(values) <= key < len(values):
+            return values[key]
+    return _Unknown
+
+
+def _queryItems(node):
+    container = _queryContainer(node)
+    if isinstance(container, google.protobuf.struct_pb2.Struct):
+        fields = container.fields
+        return [fields[key] for key in sorted(fields)]
+    if container is not None:
+        return container.values
+    return ()
+
+
+def _queryKeyStep(key):
+    def step(nodes):
+        children = []
+        for node in nodes:
+            child = _queryChild(node, key)
+            if child is not _Unknown:
+                children.append(child)
+        return children
+    return step
+
+
+def _queryWildcardStep(nodes):
+    children = []
+    for node in nodes:
+        children.extend(_queryItems(node))
+    return children
+
+
+def _queryFilterStep(keys, operator, literal):
+    compare = _QUERY_OPERATORS.get(operator)
+    def step(nodes):
+        children = []
+        for node in nodes:
+            for item in _queryItems(node):
+                value = item
+                for key in keys:
+                    value = _queryChild(value, key)
+                    if value is _Unknown:
+                        break
+                else:
+                    if value.WhichOneof('kind') is None:
+                        continue
+                    if compare is None:
+                        children.append(item)
+                        continue
+                    try:
+                        if compare(_nativeValue(value, UNKNOWN), literal):
+                            children.append(item)
+                    except TypeError:
+                        pass
+        return children
+    return step
+
+
+def _parseQuery(query):
+    if query.startswith('$'):
+        query = query[1:]
+    if query.startswith('.'):
+        query = query[1:]
+    steps = []
+    position = 0
+    while position < len(query):
+        match = _QUERY_STEP.match(query, position)
+        if match is None or (position == 0 and match.group(0).startswith('.')):
+            raise ValueError(f"Invalid query: {query}")
+        if match['wildcard'] or match['indexWildcard']:
+            steps.append(_queryWildcardStep)
+        elif match['filter'] is not None:
+            path = match['filter'].lstrip('.')
+            keys = _parsePath(path) if path else ()
+            literal = match['literal']
+            if literal is not None:
+                literal = json.loads(literal if literal[0] != "'" else json.dumps(literal[1:-1]))
+            steps.append(_queryFilterStep(keys, match['operator'], literal))
+        else:
+            key = next(key for key in match.group('name', 'index', 'quoted', 'doubleQuoted') if key is not None)
+            steps.append(_queryKeyStep(int(key) if match['index'] is not None else key))
+        position = match.end()
+    return tuple(steps)
+
+_QUERY_STEP = re.compile(r"""
+    (?:^|\.)(?:(?P<wildcard>\*)|(?P<name>[^.\[\]*]+))
+    | \[(?:
+        (?P<indexWildcard>\*)
+        | (?P<index>-?\d+)
+        | '(?P<quoted>[^']*)'
+        | "(?P<doubleQuoted>[^"]*)"
+        | \?\(\s*@(?P<filter>(?:\.[^.\[\]\s=!<>()]+|\[-?\d+\]|\['[^']*'\]|\["[^"]*"\])*)
+            \s*(?:(?P<operator>==|!=|<=|>=|<|>)\s*(?P<literal>'[^']*'|"[^"]*"|-?\d+(?:\.\d+)?|true|false|null))?\s*\)
+    )\]
+""", re.VERBOSE)
+
+_QUERY_OPERATORS = {
+    '==': operator.eq,
+    '!=': operator.ne,
+    '<': operator.lt,
+    '<=': operator.le,
+    '>': operator.gt,
+    '>=': operator.ge,
+}
 
 
 def _formatObject(object, spec='yaml'):
     match spec:
         case 'json':
-            return json.dumps(object, indent=2, cls=_JSONEncoder)
+            return json.dumps(object._toNative('<<UNKNOWN>>'), indent=2)
         case 'jsonc':
-            return json.dumps(object, separators=(',', ':'), cls=_JSONEncoder)
+            return json.dumps(object._toNative('<<UNKNOWN>>'), separators=(',', ':'))
         case 'protobuf':
             if isinstance(object, Message):
                 return str(object._message)
@@ -1345,42 +2202,38 @@ def _formatObject(object, spec='yaml'):
             return yaml.dump(object, Dumper=_Dumper)
 
 
-class _JSONEncoder(json.JSONEncoder):
-    def default(self, object):
-        if isinstance(object, (Message, MapMessage)):
-            if object:
-                return {key: value for key, value in object}
-            return None
-        if isinstance(object, RepeatedMessage):
-            if object:
-                return [value for value in object]
-            return None
-        if isinstance(object, FieldMessage):
-            return object._value
-        if isinstance(object, Value):
-            match object._kind:
-                case 'struct_value' | 'Struc':
-                    return {key: value for key, value in object}
-                case 'list_value' | 'ListValue':
-                    return [value for value in object]
-                case 'string_value':
-                    return object._value.string_value
-                case 'null_value':
-                    return None
-                case 'number_value':
-                    value = object._value.number_value
-                    if value.is_integer():
-                        value = int(value)
-                    return value
-                case 'bool_value':
-                    return object._value.bool_value
-                case 'Unknown':
-                    return '<<UNKNOWN>>'
-                case _:
-                    return '<<UNEXPECTED>>'
-        if isinstance(object, datetime.datetime):
-            return object.isoformat()
-        return super(_JSONEncoder, self).default(object)
+def _setNative(value, data):
+    """Set the struct_pb2.Value from plain Python data in one pass, without creating wrappers.
+
+    Returns False, leaving value partially set, if data contains anything else. For example
+    wrappers, which must be set using Value.__setitem__ so dependencies and unknowns are tracked.
+    """
+    kind = type(data)
+    if kind is str:
+        value.string_value = data
+    elif kind is dict:
+        struct = value.struct_value
+        struct.Clear()
+        fields = struct.fields
+        for k, v in data.items():
+            if type(k) is not str or not _setNative(fields[k], v):
+                return False
+    elif kind is list or kind is tuple:
+        values = value.list_value
+        values.Clear()
+        values = values.values
+        for v in data:
+            if not _setNative(values.add(), v):
+                return False
+    elif kind is bool:
+        value.bool_value = data
+    elif kind is int or kind is float:
+        value.number_value = data
+    elif data is None:
+        value.null_value = 0
+    else:
+        return False
+    return True
 
 
 class _Dumper(yaml.SafeDumper):
@@ -236,12 +236,12 @@ class Command(command.Command):
         resources = []
         for entry in entries:
             if entry.is_file():
-                for document in yaml.safe_load_all(entry.read_text()):
+                for document in yaml.load_all(entry.read_text(), Loader=protobuf.SafeLoader):
                     resources.append(protobuf.Value(None, None, document))
             elif entry.is_dir():
                 for file in entry.iterdir():
                     if file.suffix in ('.yaml', '.yml'):
-                        for document in yaml.safe_load_all(file.read_text()):
+                        for document in yaml.load_all(file.read_text(), Loader=protobuf.SafeLoader):
                             resources.append(protobuf.Value(None, None, document))
             else:
                 print(f"Specified resource is not a file or a directory: {entry}", file=sys.stderr)
@@ -0,0 +1,197 @@
+
+import difflib
+import logging
+import math
+import os
+import pathlib
+import random
+import sys
+import time
+
+from crossplane.function.proto.v1 import run_function_pb2 as fnv1
+from google.protobuf import text_format
+
+from . import (
+    command,
+    function,
+)
+
+logger = logging.getLogger(__name__)
+
+SUFFIX = '.binpb'
+
+
+class Command(command.Command):
+    name = 'replay'
+    help = 'Replay recorded RunFunctionRequests through the FunctionRunner'
+
+    @classmethod
+    def add_parser_arguments(cls, parser):
+        cls.add_function_arguments(parser)
+        parser.add_argument(
+            'records',
+            type=pathlib.Path,
+            nargs='+',
+            metavar='PATH',
+            help='A file, or directory of files, written by the grpc command --record-dir option.',
+        )
+        parser.add_argument(
+            '--iterations',
+            type=int,
+            default=1,
+            metavar='ITERATIONS',
+            help='Number of times to replay all requests, default 1.',
+        )
+        parser.add_argument(
+            '--diffs',
+            type=int,
+            default=10,
+            metavar='DIFFS',
+            help='Maximum number of response differences to print, default 10.',
+        )
+
+    def initialize(self):
+        self.initialize_function()
+        # Only report compose failures, not the logging of every replayed request
+        logging.getLogger().setLevel(logging.DEBUG if self.args.debug else logging.WARNING)
+
+    async def run(self):
+        records = []
+        for path in self.args.records:
+            records.extend(read_records(path))
+        if not records:
+            print('No recorded requests found', file=sys.stderr)
+            sys.exit(1)
+
+        runner = function.FunctionRunner(self.args.render_unknowns, self.args.crossplane_v1)
+        latencies = []
+        diffs = 0
+        start = time.perf_counter()
+        for iteration in range(self.args.iterations):
+            for ix, (request, expected) in enumerate(records):
+                request_start = time.perf_counter()
+                response = await runner.RunFunction(request, None)
+                latencies.append(time.perf_counter() - request_start)
+                if iteration == 0 and response != expected:
+                    diffs += 1
+                    if diffs <= self.args.diffs:
+                        print(f"Response {ix} differs:")
+                        sys.stdout.writelines(difflib.unified_diff(
+                            text_format.MessageToString(expected).splitlines(keepends=True),
+                            text_format.MessageToString(response).splitlines(keepends=True),
+                            'recorded',
+                            'replayed',
+                        ))
+        elapsed = time.perf_counter() - start
+
+        print(f"Requests:    {len(latencies)}")
+        print(f"Differences: {diffs}")
+        print_latencies(latencies, elapsed)
+
+
+class Recorder:
+    """Records sampled requests and responses into size rotated files.
+
+    Each record is a varint length delimited RunFunctionRequest followed by
+    its varint length delimited RunFunctionResponse.
+    """
+
+    def __init__(self, directory, rate=1.0, max_bytes=64 * 1024 * 1024, max_files=10):
+        self.directory = pathlib.Path(directory).expanduser().resolve()
+        self.rate = rate
+        self.max_bytes = max_bytes
+        self.max_files = max_files
+        self.file = None
+        self.size = 0
+
+    def record(self, request, response):
+        if self.rate < 1.0 and random.random() >= self.rate:
+            return
+        if self.file is None or self.size >= self.max_bytes:
+            self.rotate()
+        record = bytearray()
+        for message in (request, response):
+            message = message.SerializeToString()
+            record += encode_varint(len(message))
+            record += message
+        self.file.write(record)
+        self.file.flush()
+        self.size += len(record)
+
+    def rotate(self):
+        if self.file is not None:
+            self.file.close()
+        self.directory.mkdir(parents=True, exist_ok=True)
+        path = self.directory / f"requests-{time.strftime('%Y%m%d%H%M%S')}-{os.getpid()}-{time.monotonic_ns()}{SUFFIX}"
+        self.file = path.open('wb')
+        self.size = 0
+        files = sorted(self.directory.glob(f"*{SUFFIX}"), key=lambda file: file.stat().st_mtime)
+        for file in files[:-self.max_files]:
+            if file != path:
+                file.unlink(missing_ok=True)
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+
+def read_records(path):
+    path = pathlib.Path(path)
+    if path.is_dir():
+        records = []
+        for file in sorted(path.glob(f"*{SUFFIX}")):
+            records.extend(read_records(file))
+        return records
+    data = path.read_bytes()
+    records = []
+    position = 0
+    while position < len(data):
+        messages = []
+        for clazz in (fnv1.RunFunctionRequest, fnv1.RunFunctionResponse):
+            length, position = decode_varint(data, position)
+            if position + length > len(data):
+                # Truncated by a process exiting while recording
+                return records
+            messages.append(clazz.FromString(data[position:position + length]))
+            position += length
+        records.append(tuple(messages))
+    return records
+
+
+def encode_varint(value):
+    encoded = bytearray()
+    while value > 0x7f:
+        encoded.append((value & 0x7f) | 0x80)
+        value >>= 7
+    encoded.append(value)
+    return bytes(encoded)
+
+
+def decode_varint(data, position):
+    value = 0
+    shift = 0
+    while True:
+        if position >= len(data):
+            return sys.maxsize, position
+        byte = data[position]
+        position += 1
+        value |= (byte & 0x7f) << shift
+        if not byte & 0x80:
+            return value, position
+        shift += 7
+
+
+def percentile(values, percent):
+    """The nearest rank percentile of sorted values."""
+    if not values:
+        return 0.0
+    return values[min(len(values), max(1, math.ceil(percent / 100 * len(values)))) - 1]
+
+
+def print_latencies(latencies, elapsed):
+    latencies = sorted(latencies)
+    print(f"Elapsed:     {elapsed:.3f}s")
+    print(f"Throughput:  {len(latencies) / elapsed if elapsed else 0.0:.1f}/s")
+    for name, percent in (('p50', 50), ('p90', 90), ('p99', 99), ('p99.9', 99.9), ('max', 100)):
+        print(f"Latency {name + ':':6}{percentile(latencies, percent) * 1000:9.3f}ms")
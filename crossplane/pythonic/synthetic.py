@@ -0,0 +1,145 @@
+
+"""Generates synthetic RunFunctionRequests of configurable size for benchmarks and scaling tests."""
+
+from crossplane.function.proto.v1 import run_function_pb2 as fnv1
+from google.protobuf import struct_pb2
+
+STEP = 'synthetic'
+
+# Each resource reads the required resources and the deepest observed status value of the
+# previous resource, so composing exercises dependencies, usages, and unknowns.
+COMPOSITE = '''\
+class SyntheticComposite(BaseComposite):
+  def compose(self):
+    depth = int(self.spec.depth)
+    requireds = int(self.spec.requireds)
+    for ix in range(requireds):
+      self.requireds[f"required-{ix}"]('ConfigMap', 'v1', 'synthetic', f"required-{ix}")
+    for ix in range(int(self.spec.schemas)):
+      self.schemas[f"schema-{ix}"]('Bucket', 's3.aws.upbound.io/v1beta1')
+    previous = None
+    for ix in range(int(self.spec.resources)):
+      resource = self.resources[f"resource-{ix:05}"]('s3.aws.upbound.io/v1beta1', 'Bucket')
+      resource.metadata.labels = self.metadata.labels
+      resource.spec.forProvider.region = self.spec.region
+      resource.spec.forProvider.index = ix
+      if requireds:
+        resource.spec.forProvider.config = self.requireds[f"required-{ix % requireds}"][0].data.value
+      if previous:
+        value = previous.observed.status
+        for level in range(depth):
+          value = value[f"level{level}"]
+        resource.spec.forProvider.previous = value
+      self.status.resources[ix] = resource.observed.status.atProvider.arn
+      previous = resource
+'''
+
+
+def request(resources=10, depth=3, requireds=0, schemas=0, context=0, observed=1.0):
+    """Create a RunFunctionRequest composing resources Buckets.
+
+    Args:
+        resources: The number of composed resources.
+        depth: The depth of the observed status of each composed resource.
+        requireds: The number of required resources provided.
+        schemas: The number of required schemas provided.
+        context: The number of context entries.
+        observed: The fraction of composed resources which have observed state,
+            resources without observed state result in unknowns.
+    """
+    request = fnv1.RunFunctionRequest()
+    request.input['composite'] = COMPOSITE
+    request.input['step'] = STEP
+    request.observed.composite.resource.update({
+        'apiVersion': 'pythonic.crossplane.io/v1alpha1',
+        'kind': 'Synthetic',
+        'metadata': {
+            'name': 'synthetic',
+            'labels': {
+                'app': 'synthetic',
+                'size': str(resources),
+            },
+        },
+        'spec': {
+            'region': 'us-east-1',
+            'resources': resources,
+            'depth': depth,
+            'requireds': requireds,
+            'schemas': schemas,
+        },
+    })
+
+    step = struct_pb2.Struct()
+    step['iteration'] = 1
+    for ix in range(requireds):
+        name = f"required-{ix}"
+        # Record the requirement as already requested by a previous iteration
+        step.get_or_create_struct('requireds')[name] = {
+            'kind': 'ConfigMap',
+            'apiVersion': 'v1',
+            'namespace': 'synthetic',
+            'matchName': name,
+        }
+        request.required_resources[name].items.add().resource.update({
+            'apiVersion': 'v1',
+            'kind': 'ConfigMap',
+            'metadata': {
+                'name': name,
+                'namespace': 'synthetic',
+            },
+            'data': {
+                'value': f"value-{ix}",
+            },
+        })
+    for ix in range(schemas):
+        name = f"schema-{ix}"
+        step.get_or_create_struct('schemas')[name] = {
+            'kind': 'Bucket',
+            'apiVersion': 's3.aws.upbound.io/v1beta1',
+        }
+        request.required_schemas[name].openapi_v3.update({
+            'type': 'object',
+            'properties': {
+                'spec': {
+                    'type': 'object',
+                    'properties': {
+                        'forProvider': {
+                            'type': 'object',
+                            'properties': {
+                                field: {'type': 'string'}
+                                for field in ('region', 'config', 'previous')
+                            },
+                        },
+                    },
+                },
+            },
+        })
+    request.context.get_or_create_struct('_pythonic')[STEP] = step
+    for ix in range(context):
+        request.context[f"synthetic-{ix}"] = {
+            'name': f"synthetic-{ix}",
+            'values': [ix, str(ix), {'index': ix}],
+        }
+
+    observed_count = int(resources * observed)
+    for ix in range(observed_count):
+        status = {'value': f"status-{ix}"}
+        for level in reversed(range(depth)):
+            status = {f"level{level}": status}
+        status['atProvider'] = {'arn': f"arn:aws:s3:::synthetic-{ix:05}"}
+        status['conditions'] = [{'type': 'Ready', 'status': 'True', 'reason': 'Available'}]
+        request.observed.resources[f"resource-{ix:05}"].resource.update({
+            'apiVersion': 's3.aws.upbound.io/v1beta1',
+            'kind': 'Bucket',
+            'metadata': {
+                'name': f"synthetic-{ix:05}",
+            },
+            'spec': {
+                'forProvider': {
+                    'region': 'us-east-1',
+                    'index': ix,
+                },
+            },
+            'status': status,
+        })
+    return request
@@ -0,0 +1,134 @@
+
+import asyncio
+import concurrent.futures
+import logging
+import multiprocessing
+import os
+import signal
+import sys
+
+from crossplane.function.proto.v1 import run_function_pb2 as fnv1
+
+from . import (
+    command,
+    function,
+    metrics,
+    profiler,
+    protobuf,
+)
+
+logger = logging.getLogger(__name__)
+
+# The FunctionRunner and event loop of a compose worker process
+RUNNER = None
+LOOP = None
+# Metrics observed by the compose worker, returned to the gRPC server process
+OBSERVED = []
+
+
+class ComposePool:
+    """Runs compose in a pool of worker processes, keeping the gRPC event loop responsive."""
+
+    # Seconds to wait for more module invalidations before replacing the worker processes
+    invalidate_delay = 1.0
+
+    def __init__(self, workers, args):
+        self.workers = workers
+        self.args = args
+        self.executor = None
+        self.stale = False
+        self.restarting = None
+        self.start()
+
+    def start(self):
+        # Spawn, as forking a process with a running gRPC server is not safe
+        self.executor = concurrent.futures.ProcessPoolExecutor(
+            self.workers,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=initialize,
+            initargs=(self.args, list(sys.path)),
+        )
+        # Pre-warm all the worker processes instead of starting them on the first requests
+        for _ in range(self.workers):
+            self.executor.submit(os.getpid)
+
+    def restart(self):
+        # Running requests complete in the previous processes
+        if self.restarting:
+            self.restarting.cancel()
+            self.restarting = None
+        self.stale = False
+        executor = self.executor
+        self.start()
+        executor.shutdown(wait=False)
+
+    async def run_function(self, request):
+        if self.stale:
+            self.restart()
+        executor = self.executor
+        try:
+            response, observed = await asyncio.get_running_loop().run_in_executor(
+                executor,
+                compose,
+                request.SerializeToString(),
+            )
+        except concurrent.futures.process.BrokenProcessPool:
+            # A worker process died, requests running in the pool fail and later requests
+            # run in a new pool.
+            if self.executor is executor:
+                logger.error('Compose worker process died, replacing the worker processes')
+                self.restart()
+            raise
+        for observation in observed:
+            metrics.observe(*observation)
+        return fnv1.RunFunctionResponse.FromString(response)
+
+    def invalidate(self):
+        # Individual pool processes cannot be addressed, so all of them are replaced.
+        # Invalidations arrive in bursts, so replacing them waits for the burst to end,
+        # or until the next request.
+        self.stale = True
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self.restart()
+            return
+        if self.restarting:
+            self.restarting.cancel()
+        self.restarting = loop.call_later(self.invalidate_delay, self.restart)
+
+    def signal(self, signum):
+        for process in list(self.executor._processes.values()):
+            if process.is_alive():
+                os.kill(process.pid, signum)
+
+    def shutdown(self):
+        if self.restarting:
+            self.restarting.cancel()
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+def initialize(args, path):
+    global RUNNER, LOOP
+    command.Command(args).initialize_function()
+    sys.path[:] = path
+    sys.dont_write_bytecode = True
+    RUNNER = function.FunctionRunner(args.render_unknowns, args.crossplane_v1, args.composite_cache_size)
+    protobuf.PARSE_CACHE.size = args.parse_cache_size
+    protobuf.WEAK_CACHES = args.weak_read_caches
+    RUNNER.observe = lambda *observation: OBSERVED.append(observation)
+    if getattr(args, 'profile_dir', None):
+        RUNNER.profiler = profiler.create(args)
+        signal.signal(signal.SIGUSR1, lambda *_: RUNNER.profiler.toggle())
+    LOOP = asyncio.new_event_loop()
+
+
+def compose(request):
+    request = fnv1.RunFunctionRequest.FromString(request)
+    try:
+        response = LOOP.run_until_complete(RUNNER.run_function(request))
+    except Exception as e:
+        response = RUNNER.fatal(request, logger, 'RunFunction', e)
+    observed = OBSERVED[:]
+    OBSERVED.clear()
+    return response.SerializeToString(), observed
@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+# Generated by the protocol buffer compiler.  DO NOT EDIT!
+# NO CHECKED-IN PROTOBUF GENCODE
+# source: tests/protobuf/pytest.proto
+# Protobuf Python Version: 6.31.1
+"""Generated protocol buffer code."""
+from google.protobuf import descriptor as _descriptor
+from google.protobuf import descriptor_pool as _descriptor_pool
+from google.protobuf import runtime_version as _runtime_version
+from google.protobuf import symbol_database as _symbol_database
+from google.protobuf.internal import builder as _builder
+_runtime_version.ValidateProtobufRuntimeVersion(
+    _runtime_version.Domain.PUBLIC,
+    6,
+    31,
+    1,
+    '',
+    'tests/protobuf/pytest.proto'
+)
+# @@protoc_insertion_point(imports)
+
+_sym_db = _symbol_database.Default()
+
+
+from google.protobuf import struct_pb2 as google_dot_protobuf_dot_struct__pb2
+
+
+DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n\x1btests/protobuf/pytest.proto\x1a\x1cgoogle/protobuf/struct.proto\"\xef\x03\n\x07Message\x12\x0e\n\x06string\x18\x01 \x01(\t\x12\'\n\x06struct\x18\x02 \x01(\x0b\x32\x17.google.protobuf.Struct\x12(\n\x04list\x18\x03 \x01(\x0b\x32\x1a.google.protobuf.ListValue\x12+\n\nmap_string\x18\x04 \x03(\x0b\x32\x17.Message.MapStringEntry\x12%\n\x07map_map\x18\x05 \x03(\x0b\x32\x14.Message.MapMapEntry\x12\'\n\x08map_list\x18\x06 \x03(\x0b\x32\x15.Message.MapListEntry\x12\x13\n\x0blist_string\x18\x07 \x03(\t\x12)\n\x08list_map\x18\x08 \x03(\x0b\x32\x17.google.protobuf.Struct\x1a\x30\n\x0eMapStringEntry\x12\x0b\n\x03key\x18\x01 \x01(\t\x12\r\n\x05value\x18\x02 \x01(\t:\x02\x38\x01\x1a\x46\n\x0bMapMapEntry\x12\x0b\n\x03key\x18\x01 \x01(\t\x12&\n\x05value\x18\x02 \x01(\x0b\x32\x17.google.protobuf.Struct:\x02\x38\x01\x1aJ\n\x0cMapListEntry\x12\x0b\n\x03key\x18\x01 \x01(\t\x12)\n\x05value\x18\x02 \x01(\x0b\x32\x1a.google.protobuf.ListValue:\x02\x38\x01\x62\x06proto3')
+
+_globals = globals()
+_builder.BuildMessageAndEnumDescriptors(DESCRIPTOR, _globals)
+_builder.BuildTopDescriptorsAndMessages(DESCRIPTOR, 'tests.protobuf.pytest_pb2', _globals)
+if not _descriptor._USE_C_DESCRIPTORS:
+  DESCRIPTOR._loaded_options = None
+  _globals['_MESSAGE_MAPSTRINGENTRY']._loaded_options = None
+  _globals['_MESSAGE_MAPSTRINGENTRY']._serialized_options = b'8\001'
+  _globals['_MESSAGE_MAPMAPENTRY']._loaded_options = None
+  _globals['_MESSAGE_MAPMAPENTRY']._serialized_options = b'8\001'
+  _globals['_MESSAGE_MAPLISTENTRY']._loaded_options = None
+  _globals['_MESSAGE_MAPLISTENTRY']._serialized_options = b'8\001'
+  _globals['_MESSAGE']._serialized_start=62
+  _globals['_MESSAGE']._serialized_end=557
+  _globals['_MESSAGE_MAPSTRINGENTRY']._serialized_start=361
+  _globals['_MESSAGE_MAPSTRINGENTRY']._serialized_end=409
+  _globals['_MESSAGE_MAPMAPENTRY']._serialized_start=411
+  _globals['_MESSAGE_MAPMAPENTRY']._serialized_end=481
+  _globals['_MESSAGE_MAPLISTENTRY']._serialized_start=483
+  _globals['_MESSAGE_MAPLISTENTRY']._serialized_end=557
+# @@protoc_insertion_point(module_scope)
@@ -0,0 +1,49 @@
+from google.protobuf import struct_pb2 as _struct_pb2
+from google.protobuf.internal import containers as _containers
+from google.protobuf import descriptor as _descriptor
+from google.protobuf import message as _message
+from collections.abc import Iterable as _Iterable, Mapping as _Mapping
+from typing import ClassVar as _ClassVar, Optional as _Optional, Union as _Union
+
+DESCRIPTOR: _descriptor.FileDescriptor
+
+class Message(_message.Message):
+    __slots__ = ("string", "struct", "list", "map_string", "map_map", "map_list", "list_string", "list_map")
+    class MapStringEntry(_message.Message):
+        __slots__ = ("key", "value")
+        KEY_FIELD_NUMBER: _ClassVar[int]
+        VALUE_FIELD_NUMBER: _ClassVar[int]
+        key: str
+        value: str
+        def __init__(self, key: _Optional[str] = ..., value: _Optional[str] = ...) -> None: ...
+    class MapMapEntry(_message.Message):
+        __slots__ = ("key", "value")
+        KEY_FIELD_NUMBER: _ClassVar[int]
+        VALUE_FIELD_NUMBER: _ClassVar[int]
+        key: str
+        value: _struct_pb2.Struct
+        def __init__(self, key: _Optional[str] = ..., value: _Optional[_Union[_struct_pb2.Struct, _Mapping]] = ...) -> None: ...
+    class MapListEntry(_message.Message):
+        __slots__ = ("key", "value")
+        KEY_FIELD_NUMBER: _ClassVar[int]
+        VALUE_FIELD_NUMBER: _ClassVar[int]
+        key: str
+        value: _struct_pb2.ListValue
+        def __init__(self, key: _Optional[str] = ..., value: _Optional[_Union[_struct_pb2.ListValue, _Mapping]] = ...) -> None: ...
+    STRING_FIELD_NUMBER: _ClassVar[int]
+    STRUCT_FIELD_NUMBER: _ClassVar[int]
+    LIST_FIELD_NUMBER: _ClassVar[int]
+    MAP_STRING_FIELD_NUMBER: _ClassVar[int]
+    MAP_MAP_FIELD_NUMBER: _ClassVar[int]
+    MAP_LIST_FIELD_NUMBER: _ClassVar[int]
+    LIST_STRING_FIELD_NUMBER: _ClassVar[int]
+    LIST_MAP_FIELD_NUMBER: _ClassVar[int]
+    string: str
+    struct: _struct_pb2.Struct
+    list: _struct_pb2.ListValue
+    map_string: _containers.ScalarMap[str, str]
+    map_map: _containers.MessageMap[str, _struct_pb2.Struct]
+    map_list: _containers.MessageMap[str, _struct_pb2.ListValue]
+    list_string: _containers.RepeatedScalarFieldContainer[str]
+    list_map: _containers.RepeatedCompositeFieldContainer[_struct_pb2.Struct]
+    def __init__(self, string: _Optional[str] = ..., struct: _Optional[_Union[_struct_pb2.Struct, _Mapping]] = ..., list: _Optional[_Union[_struct_pb2.ListValue, _Mapping]] = ..., map_string: _Optional[_Mapping[str, str]] = ..., map_map: _Optional[_Mapping[str, _struct_pb2.Struct]] = ..., map_list: _Optional[_Mapping[str, _struct_pb2.ListValue]] = ..., list_string: _Optional[_Iterable[str]] = ..., list_map: _Optional[_Iterable[_Union[_struct_pb2.Struct, _Mapping]]] = ...) -> None: ...
@@ -0,0 +1,296 @@
+
+import argparse
+import asyncio
+import multiprocessing
+import os
+import pytest
+import signal
+from crossplane.function.proto.v1 import run_function_pb2 as fnv1
+
+from crossplane.pythonic import admission, bench, cache, function, grpc, metrics, profiler, protobuf, replay, workers
+
+
+def request(composite, step=None):
+    request = fnv1.RunFunctionRequest(
+        observed=fnv1.State(
+            composite=fnv1.Resource(
+                resource={
+                    'apiVersion': 'pythonic.crossplane.io/v1alpha1',
+                    'kind': 'PyTest',
+                    'metadata': {
+                        'name': 'pytest',
+                    },
+                },
+            ),
+        ),
+    )
+    request.input['composite'] = composite
+    if step:
+        request.input['step'] = step
+    return request
+
+
+COMPOSITE_A = '''\
+class AComposite(BaseComposite):
+  def compose(self):
+    self.status.composite = 'a'
+'''
+
+COMPOSITE_B = '''\
+class BComposite(BaseComposite):
+  def compose(self):
+    self.status.composite = 'b'
+'''
+
+
+def test_trim_path():
+    request = fnv1.RunFunctionRequest()
+    request.observed.resources['my-bucket'].resource.update({'metadata': {'annotations': {'crossplane.io/external-name': 'x'}}})
+    request.required_resources['subnets'].items.add().resource.update({'status': {'id': 'x'}})
+    request = protobuf.Message(None, 'request', request.DESCRIPTOR, request, 'request')
+    trimPath = function.FunctionRunner().trimPath
+    assert trimPath(request.observed.composite.resource.spec.tags[0]._path()) == 'spec.tags[0]'
+    assert trimPath(request.observed.resources['my-bucket'].resource.metadata.annotations['crossplane.io/external-name']._path()) == "my-bucket.metadata.annotations['crossplane.io/external-name']"
+    assert trimPath(request.observed.resources.vpc.resource._path()) == 'request.observed.resources.vpc.resource'
+    assert trimPath(request.required_resources.subnets.items[0].resource.status.id._path()) == 'request.required_resources.subnets.items[0].resource.status.id'
+    assert trimPath(request.context['apiextensions.crossplane.io/environment'].name._path()) == "request.context['apiextensions.crossplane.io/environment'].name"
+
+
+def test_lru_cache():
+    lru = cache.LRUCache(2)
+    lru.put('a', 1)
+    lru.put('b', 2)
+    assert lru.get('a') == 1
+    lru.put('c', 3)
+    assert 'a' in lru
+    assert 'b' not in lru
+    assert lru.get('b') is None
+    assert len(lru) == 2
+    assert (lru.hits, lru.misses, lru.evictions) == (1, 1, 1)
+    lru.clear()
+    assert not len(lru)
+    disabled = cache.LRUCache(0)
+    disabled.put('a', 1)
+    assert 'a' not in disabled
+
+
+@pytest.mark.asyncio
+async def test_clazz_cache():
+    runner = function.FunctionRunner(cache_size=1)
+    for composite, expected in ((COMPOSITE_A, 'a'), (COMPOSITE_A, 'a'), (COMPOSITE_B, 'b'), (COMPOSITE_A, 'a')):
+        response = await runner.RunFunction(request(composite), None)
+        assert response.desired.composite.resource['status']['composite'] == expected
+    assert len(runner.clazzes) == 1
+    assert (runner.clazzes.hits, runner.clazzes.misses, runner.clazzes.evictions) == (1, 3, 2)
+
+
+@pytest.mark.asyncio
+async def test_digest_step():
+    runner = function.FunctionRunner()
+    first = await runner.RunFunction(request(COMPOSITE_A), None)
+    second = await function.FunctionRunner().RunFunction(request(COMPOSITE_A), None)
+    assert list(first.context['_pythonic'].keys()) == list(second.context['_pythonic'].keys())
+
+
+@pytest.mark.asyncio
+async def test_compose_pool():
+    args = argparse.Namespace(
+        debug=False,
+        log_name_width=40,
+        logger_level=[],
+        python_path=[],
+        allow_oversize_protos=False,
+        render_unknowns=False,
+        crossplane_v1=False,
+        composite_cache_size=256,
+        parse_cache_size=0,
+        weak_read_caches=False,
+    )
+    runner = function.FunctionRunner()
+    runner.compose_pool = workers.ComposePool(1, args)
+    try:
+        response = await runner.RunFunction(request(COMPOSITE_A, 'pytest-pool'), None)
+        assert response.desired.composite.resource['status']['composite'] == 'a'
+        assert response.context['_pythonic']['pytest-pool']['iteration'] == 1
+        assert metrics.REQUESTS.values[('AComposite', 'pytest-pool', 'completed')] == 1
+        runner.invalidate_module('pytest.module')
+        runner.invalidate_module('pytest.other')
+        assert runner.compose_pool.stale
+        response = await runner.RunFunction(request(COMPOSITE_B), None)
+        assert response.desired.composite.resource['status']['composite'] == 'b'
+        assert not runner.compose_pool.stale
+        assert not runner.compose_pool.restarting
+
+        # A killed worker process fails its request and the pool is replaced
+        for process in list(runner.compose_pool.executor._processes.values()):
+            os.kill(process.pid, signal.SIGKILL)
+            process.join()
+        response = await runner.RunFunction(request(COMPOSITE_B), None)
+        assert response.results[0].severity == fnv1.SEVERITY_FATAL
+        response = await runner.RunFunction(request(COMPOSITE_B), None)
+        assert response.desired.composite.resource['status']['composite'] == 'b'
+    finally:
+        runner.compose_pool.shutdown()
+
+
+def supervised_worker(args, path, invalidations, ix):
+    # Stands in for grpc.worker, reports the modules it is told to invalidate
+    while True:
+        args.invalidated.put((ix, invalidations.get()))
+
+
+@pytest.mark.asyncio
+async def test_supervisor(monkeypatch):
+    monkeypatch.setattr(grpc, 'worker', supervised_worker)
+    args = argparse.Namespace(
+        processes=2,
+        profile_dir=None,
+        invalidated=multiprocessing.get_context('spawn').SimpleQueue(),
+    )
+    supervisor = grpc.Supervisor(argparse.Namespace(args=args, packages_enabled=lambda: False))
+    running = asyncio.ensure_future(supervisor.run())
+    try:
+        while None in supervisor.processes:
+            await asyncio.sleep(0.1)
+        killed = supervisor.processes[0]
+        os.kill(killed.pid, signal.SIGKILL)
+        for _ in range(100):
+            if supervisor.processes[0] is not killed:
+                break
+            await asyncio.sleep(0.1)
+        assert supervisor.processes[0] is not killed
+        assert supervisor.processes[0].is_alive()
+        assert supervisor.processes[1].is_alive()
+
+        supervisor.invalidate_module('pytest.module')
+        invalidated = [await asyncio.to_thread(args.invalidated.get) for _ in supervisor.processes]
+        assert sorted(invalidated) == [(0, 'pytest.module'), (1, 'pytest.module')]
+    finally:
+        await supervisor.stop()
+        await asyncio.wait_for(running, 10)
+    assert not any(process.is_alive() for process in supervisor.processes)
+
+
+@pytest.mark.asyncio
+async def test_admission():
+    limit = admission.Admission(1, 1)
+    assert await limit.acquire()
+    queued = asyncio.ensure_future(limit.acquire())
+    await asyncio.sleep(0)
+    assert limit.queued == 1
+    assert not await limit.acquire()
+    limit.release()
+    assert await queued
+    assert (limit.in_flight, limit.queued, limit.admitted, limit.rejected, limit.waited) == (1, 0, 2, 1, 1)
+    limit.release()
+    assert limit.in_flight == 0
+
+    limit = admission.Admission(1, 1, 0.01)
+    assert await limit.acquire()
+    assert not await limit.acquire()
+    assert (limit.in_flight, limit.queued, limit.rejected) == (1, 0, 1)
+    limit.release()
+    assert limit.in_flight == 0
+
+    limit = admission.Admission(1, 5)
+    assert await limit.acquire()
+    queued = asyncio.ensure_future(limit.acquire())
+    await asyncio.sleep(0)
+    limit.release()
+    queued.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await queued
+    assert (limit.in_flight, limit.queued) == (0, 0)
+    assert await limit.acquire()
+    limit.release()
+    assert limit.in_flight == 0
+
+
+@pytest.mark.asyncio
+async def test_admission_shed():
+    runner = function.FunctionRunner()
+    runner.admission = admission.Admission(1, 0)
+    assert await runner.admission.acquire()
+    response = await runner.RunFunction(request(COMPOSITE_A), None)
+    assert response.results[0].severity == fnv1.SEVERITY_FATAL
+    assert response.results[0].message.startswith('Overloaded')
+    runner.admission.release()
+    response = await runner.RunFunction(request(COMPOSITE_A), None)
+    assert response.desired.composite.resource['status']['composite'] == 'a'
+    assert runner.admission.in_flight == 0
+
+
+@pytest.mark.asyncio
+async def test_metrics():
+    runner = function.FunctionRunner()
+    await runner.RunFunction(request(COMPOSITE_B, 'pytest-metrics'), None)
+    assert metrics.REQUESTS.values[('BComposite', 'pytest-metrics', 'completed')] == 1
+    for phase in ('resolve', 'init', 'compose', 'requirements', 'usages', 'unknowns', 'auto_ready'):
+        assert metrics.PHASES.values[('BComposite', 'pytest-metrics', phase)][2] == 1
+    metrics.serialize_response(fnv1.RunFunctionResponse())
+    assert metrics.PHASES.values[('BComposite', 'pytest-metrics', 'serialize')][2] == 1
+    text = metrics.render()
+    assert 'function_pythonic_requests_total{composite="BComposite",step="pytest-metrics",result="completed"} 1\n' in text
+    assert 'function_pythonic_phase_seconds_count{composite="BComposite",step="pytest-metrics",phase="compose"} 1\n' in text
+    assert 'function_pythonic_phase_seconds_bucket{composite="BComposite",step="pytest-metrics",phase="compose",le="+Inf"} 1\n' in text
+
+
+COMPOSITE_PROFILE = '''\
+import time
+class ProfileComposite(BaseComposite):
+  profile = True
+  def compose(self):
+    end = time.monotonic() + 0.05
+    while time.monotonic() < end:
+      self.status.composite = 'profile'
+'''
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize('format', ('collapsed', 'pstats'))
+async def test_profiler(tmp_path, format):
+    runner = function.FunctionRunner()
+    runner.profiler = profiler.Profiler(tmp_path, every=2, format=format)
+    for _ in range(3):
+        await runner.RunFunction(request(COMPOSITE_A), None)
+    assert not list(tmp_path.iterdir())
+    for _ in range(3):
+        await runner.RunFunction(request(COMPOSITE_PROFILE), None)
+    assert runner.profiler.calls['ProfileComposite'] == 3
+    profiles = list(tmp_path.iterdir())
+    assert len(profiles) == 1
+    assert profiles[0].name.startswith('ProfileComposite.')
+    assert profiles[0].suffix == '.' + format
+    if format == 'collapsed':
+        assert '<string>:ProfileComposite.compose' in profiles[0].read_text()
+    runner.profiler.toggle()
+    await runner.RunFunction(request(COMPOSITE_A), None)
+    assert len(list(tmp_path.iterdir())) == 2
+
+
+@pytest.mark.asyncio
+async def test_record_replay(tmp_path):
+    runner = function.FunctionRunner()
+    runner.recorder = replay.Recorder(tmp_path, max_bytes=1, max_files=2)
+    requests = [request(composite, 'pytest-record') for composite in (COMPOSITE_A, COMPOSITE_B, COMPOSITE_A)]
+    responses = [await runner.RunFunction(recorded, None) for recorded in requests]
+    runner.recorder.close()
+    assert len(list(tmp_path.iterdir())) == 2
+    records = replay.read_records(tmp_path)
+    assert records == list(zip(requests, responses))[1:]
+    for recorded, response in records:
+        assert await function.FunctionRunner().RunFunction(recorded, None) == response
+
+
+def test_percentile():
+    values = list(range(1, 101))
+    assert replay.percentile(values, 50) == 50
+    assert replay.percentile(values, 99) == 99
+    assert replay.percentile(values, 99.9) == 100
+    assert replay.percentile(values, 100) == 100
+    assert replay.percentile([], 50) == 0.0
+
+
+def test_bench_rss():
+    assert bench.rss(os.getpid()) > 0
+    assert bench.rss(None) == 0
@@ -0,0 +1,175 @@
+
+import gc
+import json
+import os
+import pathlib
+import pytest
+import time
+from google.protobuf import json_format, struct_pb2
+
+from crossplane.pythonic import protobuf
+
+# Benchmarks are only run when requested, for example: PYTEST_BENCHMARK=true
+benchmark = os.getenv('PYTEST_BENCHMARK', '').lower() == 'true'
+update_baselines = os.getenv('PYTEST_BENCHMARK_UPDATE', '').lower() == 'true'
+threshold = float(os.getenv('PYTEST_BENCHMARK_THRESHOLD', '25'))
+baselines_path = pathlib.Path(__file__).parent / 'test_protobuf_benchmarks.json'
+
+pytestmark = pytest.mark.skipif(not benchmark and not update_baselines, reason='PYTEST_BENCHMARK is not true')
+
+
+def best_time(function, repeat=7):
+    times = []
+    gc.collect()
+    gc.disable()
+    try:
+        for _ in range(repeat):
+            start = time.perf_counter()
+            function()
+            times.append(time.perf_counter() - start)
+    finally:
+        gc.enable()
+    return min(times)
+
+
+def calibration():
+    # A fixed pure Python workload, benchmarks are recorded relative to it so baselines
+    # are comparable across machines.
+    values = {}
+    for ix in range(20000):
+        values[str(ix)] = [ix, float(ix), {'ix': ix}]
+    return sum(len(value) for value in values.values())
+
+
+@pytest.fixture(scope='module')
+def baselines():
+    baselines = json.loads(baselines_path.read_text()) if baselines_path.is_file() else {}
+    results = {}
+    yield baselines, results
+    if update_baselines and results:
+        baselines.update(results)
+        baselines_path.write_text(json.dumps(dict(sorted(baselines.items())), indent=2) + '\n')
+
+
+@pytest.fixture
+def run(request, baselines):
+    baselines, results = baselines
+    def run(function):
+        name = request.node.name
+        baseline = baselines.get(name)
+        if not update_baselines and baseline is None:
+            pytest.skip(f"No baseline for {name}, run with PYTEST_BENCHMARK_UPDATE=true")
+        # Measure again when slower than the baseline, timings on shared machines are noisy
+        relative = None
+        for _ in range(3):
+            measured = best_time(function) / best_time(calibration)
+            relative = measured if relative is None else min(relative, measured)
+            if update_baselines or relative <= baseline:
+                break
+        results[name] = round(relative, 4)
+        print(f"\n{name}: {relative:.4f} relative, baseline {baseline}", end='')
+        if not update_baselines:
+            limit = baseline * (1 + threshold / 100)
+            assert relative <= limit, f"{name} regressed {(relative / baseline - 1) * 100:.1f}%, more than {threshold}%"
+    return run
+
+
+def observed_struct(resources=100, depth=5):
+    struct = struct_pb2.Value()
+    for ix in range(resources):
+        value = {'value': f"value-{ix}", 'number': ix, 'enabled': True}
+        for level in reversed(range(depth)):
+            value = {f"level{level}": value, 'labels': {'app': 'benchmark', 'index': str(ix)}}
+        struct.struct_value[f"resource-{ix}"] = value
+    return struct
+
+
+def observed_dict(resources=100, depth=5):
+    return json_format.MessageToDict(observed_struct(resources, depth))
+
+
+def test_traversal(run):
+    struct = observed_struct()
+    def traversal():
+        observed = protobuf.Value(None, None, struct, 'Observed')
+        for ix in range(100):
+            resource = observed[f"resource-{ix}"]
+            assert resource.level0.level1.level2.level3.level4.value
+            assert resource.level0.labels.app
+            assert not resource.level0.missing.value
+    run(traversal)
+
+
+def test_reread(run):
+    struct = observed_struct()
+    observed = protobuf.Value(None, None, struct, 'Observed')
+    def reread():
+        # The observed tree is kept alive across reads, as in a composition's run
+        for _ in range(5):
+            for ix in range(100):
+                resource = observed[f"resource-{ix}"]
+                assert resource.level0.level1.level2.level3.level4.value
+                assert resource.level0.labels.app
+    run(reread)
+
+
+def test_implicit_writes(run):
+    def writes():
+        value = protobuf.Map()
+        for ix in range(500):
+            entry = value.spec.resources[f"resource-{ix}"]
+            entry.forProvider.region = 'us-east-1'
+            entry.forProvider.tags.index = ix
+            entry.metadata.labels.app = 'benchmark'
+    run(writes)
+
+
+def test_construct_dict(run):
+    values = observed_dict()
+    run(lambda: protobuf.Value(None, None, values))
+
+
+def test_unknowns(run):
+    observed = protobuf.Value(None, None, observed_struct(50), 'Observed')
+    desired = protobuf.Map()
+    for ix in range(50):
+        resource = desired[f"resource-{ix}"]
+        resource.spec.value = observed[f"resource-{ix}"].level0.level1.level2.level3.level4.value
+        resource.spec.missing = observed[f"resource-{ix}"].status.missing
+        resource.spec.list[0] = observed[f"resource-{ix}"].status.missing
+    def unknowns():
+        for _ in range(10):
+            assert len(desired._getUnknowns) == 100
+    run(unknowns)
+
+
+def test_dependencies(run):
+    observed = protobuf.Value(None, None, observed_struct(50), 'Observed')
+    desired = protobuf.Map()
+    for ix in range(50):
+        resource = desired[f"resource-{ix}"]
+        resource.spec.value = observed[f"resource-{ix}"].level0.level1.level2.level3.level4.value
+        resource.spec.labels = observed[f"resource-{ix}"].level0.labels
+        resource.spec.missing = observed[f"resource-{ix}"].status.missing
+    def dependencies():
+        for _ in range(10):
+            assert len(desired._getDependencies) == 150
+    run(dependencies)
+
+
+def test_hash_equality(run):
+    struct = observed_struct(50)
+    copy = struct_pb2.Value()
+    copy.CopyFrom(struct)
+    def hash_equality():
+        value = protobuf.Value(None, None, struct, 'Observed')
+        other = protobuf.Value(None, None, copy, 'Observed')
+        assert hash(value) == hash(other)
+        assert value == other
+    run(hash_equality)
+
+
+@pytest.mark.parametrize('spec', ('yaml', 'json'))
+def test_format(run, spec):
+    struct = observed_struct(50)
+    run(lambda: format(protobuf.Value(None, None, struct, 'Observed'), spec))
@@ -48,6 +48,19 @@ struct: {}
     m.list_map[0].c = 'd'
     assert m == m
     assert hash(m) == hash(m)
+    assert m != protobuf.Message(None, 'pytest', message.DESCRIPTOR, Message())
+    copy = Message()
+    copy.CopyFrom(message)
+    other = protobuf.Message(None, 'pytest', message.DESCRIPTOR, copy)
+    assert m == other
+    assert hash(m) == hash(other)
+    assert m.map_string == other.map_string and hash(m.map_string) == hash(other.map_string)
+    assert m.list_map == other.list_map and hash(m.list_map) == hash(other.list_map)
+    other.map_string.a = 'c'
+    assert m != other
+    assert m.map_string != other.map_string
+    other.map_string.a = 'b'
+    assert m == other
     assert m.map_string
     assert 'a' in m.map_string
     assert 'b' not in m.map_string
@@ -81,6 +94,20 @@ struct:
 '''
     assert str(m) == format(m)
     assert format(m, 'yaml') == str(m)
+    assert m._toNative() == {
+        'list': ['a'],
+        'list_map': [{'c': 'd'}],
+        'list_string': ['a'],
+        'map_list': {'a': ['b']},
+        'map_map': {'a': {'b': 'c'}},
+        'map_string': {'a': 'b'},
+        'string': 'pytest',
+        'struct': {'a': 'pytest'},
+    }
+    assert protobuf.Message(None, 'pytest', message.DESCRIPTOR, message)._toNative() == m._toNative()
+    assert m.map_string._toNative() == {'a': 'b'}
+    assert m.list_string._toNative() == ['a']
+    assert m.string._toNative() == 'pytest'
     assert format(m, 'json')
     assert format(m, 'jsonc')
     assert format(m, 'protobuf')
@@ -1,5 +1,9 @@
-
-from crossplane.pythonic import protobuf
+import google.protobuf.struct_pb2
+import logging
+import pytest
+import weakref
+from crossplane.function.proto.v1 import run_function_pb2 as fnv1
+from crossplane.pythonic import composite, protobuf
 
 
 def test_map():
@@ -123,6 +127,12 @@ def test_json():
     value = protobuf.Json('1.2')
     assert isinstance(value, protobuf.Value)
     assert value == 1.2
+    value = protobuf.Map(a=1.0, b=1.5)
+    value.c.d = protobuf.Unknown()
+    assert format(value, 'jsonc') == '{"a":1,"b":1.5,"c":{"d":"<<UNKNOWN>>"}}'
+    struct = google.protobuf.struct_pb2.Struct()
+    struct['a'] = 'b'
+    assert format(protobuf.Value(None, None, struct), 'jsonc') == '{"a":"b"}'
 
 def test_values_map():
     values = protobuf.Map(
@@ -227,3 +237,326 @@ def test_create_child():
     assert not list._getUnknowns
     list[0][0] = protobuf.Unknown()
     assert list._getUnknowns
+
+def test_kind_changes():
+    value = protobuf.Map(a='b', c=[1])
+    a = value.a
+    c = value.c
+    assert a._kind == 'string_value'
+    assert c._isList
+    value.a = {'d': 'e'}
+    value.c = 'f'
+    assert a._isMap
+    assert a.d == 'e'
+    assert c._kind == 'string_value'
+    assert c == 'f'
+    value()
+    assert value._isMap
+    assert len(value) == 0
+
+    value = protobuf.Map(a='b', spec={'a': {'b': 'c'}})
+    old = value.a
+    value.a = 'x'
+    assert str(old) == 'x'
+    value.a = {'n': 1}
+    assert old._isMap
+    b = protobuf.Path('spec.a.b').get(value)
+    value.spec.a.b = {'n': 1}
+    assert b._isMap
+    assert b.n == 1
+
+def test_native():
+    data = {'a': [1, 2.5, True, None, 'b', {}, []], 'c': {'d': {'e': 'f'}}, 'g': ('h',)}
+    value = protobuf.Value(None, None, data)
+    assert value.a == [1, 2.5, True, None, 'b', {}, []]
+    assert value.a[5]._isMap
+    assert value.a[6]._isList
+    assert value.c.d.e == 'f'
+    assert value.g[0] == 'h'
+    assert not value._getDependencies
+    source = protobuf.Map(e='f')
+    value = protobuf.Map()
+    value.a = {'b': [1, {'c': source.e, 'd': 'g'}], 'h': 'i'}
+    assert value.a.b[1].c == 'f'
+    assert value.a.b[1].d == 'g'
+    assert value.a.h == 'i'
+    assert value._getDependencies == {'a.b[1].c': 'e'}
+
+def test_to_native():
+    value = protobuf.Yaml('''
+a: 1
+b: [1, 2.5, x]
+c:
+  d: null
+  e: true
+''')
+    assert value._toNative() == {'a': 1, 'b': [1, 2.5, 'x'], 'c': {'d': None, 'e': True}}
+    value.c.f.g = protobuf.Unknown()
+    value.b[4] = protobuf.Unknown()
+    native = value._toNative()
+    assert native['c']['f'] == {'g': protobuf.UNKNOWN}
+    assert native['b'] == [1, 2.5, 'x', protobuf.UNKNOWN, protobuf.UNKNOWN]
+    assert not protobuf.UNKNOWN
+    assert value._toNative('<<UNKNOWN>>')['c']['f']['g'] == '<<UNKNOWN>>'
+    assert list(value._toNative()) == ['a', 'b', 'c']
+    assert value.a._toNative() == 1
+    assert protobuf.Unknown()._toNative() is protobuf.UNKNOWN
+
+def test_parse_cache():
+    protobuf.PARSE_CACHE.size = 2
+    try:
+        first = protobuf.Yaml('a: b', True)
+        second = protobuf.Yaml('a: b', True)
+        assert protobuf.PARSE_CACHE.hits == 1
+        assert first._value is second._value
+        writable = protobuf.Yaml('a: b')
+        assert protobuf.PARSE_CACHE.hits == 2
+        writable.a = 'c'
+        assert protobuf.Yaml('a: b', True).a == 'b'
+        assert protobuf.Json('{"a": "b"}', True).a == 'b'
+        assert protobuf.YamlAll('a: b', True)[0].a == 'b'
+        assert protobuf.PARSE_CACHE.evictions == 1
+        assert len(protobuf.PARSE_CACHE) == 2
+    finally:
+        protobuf.PARSE_CACHE.size = 0
+        protobuf.PARSE_CACHE.clear()
+
+def test_path():
+    assert protobuf.Path('a.b[0]') is protobuf.Path('a.b[0]')
+    assert protobuf.Path("a['b.c'][1].d").keys == ('a', 'b.c', 1, 'd')
+    assert protobuf.Path(['a', 0]).keys == ('a', 0)
+    for path in ('', '.a', 'a..b', 'a[', 'a[0]b'):
+        with pytest.raises(ValueError):
+            protobuf.Path(path)
+
+    source = protobuf.Value(None, 'source', {'a': {'b': [{'c': 'd'}]}}, 'source')
+    path = protobuf.Path('a.b[0].c')
+    assert path.get(source) == 'd'
+    assert path.exists(source)
+    assert not protobuf.Path('a.b[1].c').exists(source)
+    assert not protobuf.Path('a.x.y').get(source)
+    c = source.a.b[0].c
+    assert c == 'd'
+    assert path.get(source) is c
+    with pytest.raises(ValueError):
+        protobuf.Path('a.b.c').get(source)
+    with pytest.raises(ValueError):
+        path.set(source, 'e')
+
+    value = protobuf.Map()
+    protobuf.Path('x.y[1].z').set(value, 'plain')
+    assert value.x.y[1].z == 'plain'
+    assert not value.x.y[0]
+    protobuf.Path('x.w').set(value, {'v': [1, 2]})
+    assert value.x.w.v[1] == 2
+    detached = protobuf.Value(None, 'source', {'a': {'b': [{'c': 'd'}]}}, 'source')
+    protobuf.Path('d.e').set(value, path.get(detached))
+    protobuf.Path('d.f').set(value, protobuf.Path('a.missing.value').get(detached))
+    assert value.d.e == 'd'
+    assert value._getDependencies == {'d.e': 'source.a.b[0].c', 'd.f': 'source.a.missing.value'}
+    assert value._getUnknowns == {'d.f': 'source.a.missing.value'}
+    protobuf.Path('d.f').set(value, 'known')
+    assert not value._getUnknowns
+
+    value = protobuf.Map()
+    protobuf.Path('a.b.c').get(value).d = source.a.b[0].c
+    assert value.a.b.c.d == 'd'
+    assert value._getDependencies == {'a.b.c.d': 'source.a.b[0].c'}
+
+    value = protobuf.Map(spec={'a': {'b': {}}})
+    b = protobuf.Path('spec.a.b').get(value)
+    assert b is value.spec.a.b
+    value.spec.a.b.c = source.a.b[0].c
+    b.e = source.a
+    assert value._getDependencies == {'spec.a.b.c': 'source.a.b[0].c', 'spec.a.b.e': 'source.a'}
+
+
+def test_digest():
+    a = protobuf.Map(x=1, y=[1, {'z': 'a'}])
+    b = protobuf.Value(None, None, {'y': [1, {'z': 'a'}], 'x': 1})
+    assert a == b
+    assert hash(a) == hash(b)
+    assert a.y == b.y and hash(a.y) == hash(b.y)
+    b.y[1].z = 'b'
+    assert a != b
+    assert a.y != b.y
+    b.y[1].z = 'a'
+    assert a == b
+
+    observed = protobuf.Value(None, None, {'x': 1}, 'observed')
+    assert protobuf.Map(x=1) == observed
+    assert observed._digest() is observed._digest()
+    a.w = observed.missing
+    assert a._digest() is None
+    assert a != b
+    a.w = 2
+    b.w = 2
+    assert a == b
+
+    assert protobuf.Map(x=0.0) == protobuf.Map(x=-0.0)
+    assert hash(protobuf.Map(x=[0.0])) == hash(protobuf.Map(x=[-0.0]))
+    assert protobuf.Map(x=float('nan')) != protobuf.Map(x=float('nan'))
+    request = protobuf.Message(None, 'request', fnv1.RunFunctionRequest.DESCRIPTOR, fnv1.RunFunctionRequest())
+    present = fnv1.RunFunctionRequest()
+    present.meta.SetInParent()
+    present = protobuf.Message(None, 'request', fnv1.RunFunctionRequest.DESCRIPTOR, present)
+    assert request == present
+    assert hash(request) == hash(present)
+
+    # Writes only invalidate the digests of their own tree
+    digest = observed._digest()
+    a.v = 1
+    assert observed._digest() is digest
+    digest = b._digest()
+    a.v = 2
+    assert b._digest() is digest
+    b.v = 2
+    assert b._digest() is not digest
+    assert a == b
+    deep = b.spec.deep
+    digest = b._digest()
+    deep.v = 3
+    assert b._digest() != digest
+    assert a != b
+
+    # Trees holding unknowns have no digest, they are compared and hashed field by field
+    a = protobuf.Map(m={'z': 0.0, 'n': {'k': [0.0]}})
+    a.x.y = observed.missing
+    a.l[1] = observed.other
+    b = protobuf.Map(m={'z': -0.0, 'n': {'k': [-0.0]}})
+    b.x.y = observed.absent
+    b.l[1] = observed.other
+    assert a._digest() is None
+    assert a.m._digest() is not None
+    assert a == b
+    assert hash(a) == hash(b)
+    b.m.n.k[0] = 1
+    assert a != b
+
+
+def test_tracking():
+    source = protobuf.Value(None, 'source', {'a': {'b': 'c'}, 'l': [1, 2]}, 'source')
+    value = protobuf.Map()
+    value.x.y = source.a.b
+    value.x.z = source.missing
+    value.l[0] = source.l[1]
+    value.l[1] = source.other
+    value.m.n = source.a
+    assert list(value._getDependencies) == ['l[0]', 'l[1]', 'm.n', 'x.y', 'x.z']
+    assert value._getUnknowns == {'l[1]': 'source.other', 'x.z': 'source.missing'}
+    assert value.x._getUnknowns == {'x.z': 'source.missing'}
+    assert not value.m._getUnknowns
+    del value.l[0]
+    assert value._getUnknowns == {'l[0]': 'source.other', 'x.z': 'source.missing'}
+    value.x = 'replaced'
+    assert value._getUnknowns == {'l[0]': 'source.other'}
+    value()
+    assert not value._getDependencies
+    assert not value._tracked
+
+    value = protobuf.Map(a={'b': {}})
+    protobuf.Path('a.b').get(value).c = source.missing
+    assert value._getUnknowns == {'a.b.c': 'source.missing'}
+    value._patchUnknowns(protobuf.Value(None, 'patch', {'a': {'b': {'c': 'patched'}}}))
+    assert value.a.b.c == 'patched'
+    assert not value._getUnknowns
+    value.a.d = source.missing
+    value._renderUnknowns(protobuf._formatPath)
+    assert value.a.d == 'UNKNOWN:source.missing'
+    assert value._getDependencies == {'a.b.c': 'patch.a.b.c', 'a.d': 'source.missing'}
+    assert value._getDependencyPaths == {('a', 'b', 'c'): ('patch', 'a', 'b', 'c'), ('a', 'd'): ('source', 'missing')}
+    assert value.a['b-c'][0]._path() == ('a', 'b-c', 0)
+    assert protobuf._formatPath(value.a['b-c'][0]._path()) == "a['b-c'][0]"
+
+
+def test_assign_subtree():
+    source = protobuf.Value(None, 'source', {'a': {'b': {'c': 1}, 'l': [{'d': 2}]}}, 'source')
+    value = protobuf.Map()
+    value.x = source.a
+    value.l = source.a.l
+    assert value.x == source.a
+    assert value.l == [{'d': 2}]
+    assert value._getDependencies == {'l': 'source.a.l', 'x': 'source.a'}
+
+    pending = protobuf.Map(a={'b': 1}, c={'d': [2]})
+    pending.a.e = source.missing
+    value = protobuf.Map()
+    value.y = pending
+    assert value.y.a.b == 1
+    assert value.y.c.d == [2]
+    assert sorted(value._getDependencies) == ['y', 'y.a', 'y.a.b', 'y.a.e', 'y.c']
+    assert value._getUnknowns == {'y.a.e': 'source.missing'}
+
+
+def test_read_only_cache(monkeypatch):
+    source = protobuf.Value(None, 'source', {'a': {'b': [{'c': 'd'}]}}, 'source')
+    c = weakref.ref(source.a.b[0].c)
+    assert c() is not None
+    monkeypatch.setattr(protobuf, 'WEAK_CACHES', True)
+    source = protobuf.Value(None, 'source', {'a': {'b': [{'c': 'd'}]}}, 'source')
+    b = source.a.b
+    assert source.a is b._parent
+    assert source.a.b is b
+    c = weakref.ref(b[0].c)
+    assert c() is None
+    assert source.a.b[0].c == 'd'
+    del b
+    assert source._cache['a'] is source.a
+    assert type(source.a.b[0]._cache['c']) is weakref.ref
+
+    value = protobuf.Map(a={'b': 'c'})
+    b = weakref.ref(value.a.b)
+    assert b() is not None
+
+
+def test_query():
+    assert protobuf.Query('a[*].b') is protobuf.Query('a[*].b')
+    for query in ('..a', 'a[', 'a[?(@.b ~ 1)]', 'a[0]b'):
+        with pytest.raises(ValueError):
+            protobuf.Query(query)
+
+    source = protobuf.Value(None, 'source', {'items': [
+        {'id': 'a', 'size': 1, 'conditions': [{'type': 'Ready', 'status': 'True'}, {'type': 'Synced', 'status': 'False'}]},
+        {'id': 'b', 'size': 3, 'conditions': [{'type': 'Ready', 'status': 'False'}]},
+        {'id': 'c', 'tags': {'x': 1, 'y': [2]}},
+    ]}, 'source')
+    assert protobuf.Query('items[*].id').all(source) == ['a', 'b', 'c']
+    assert protobuf.Query('$.items.*.size').all(source) == [1, 3]
+    assert protobuf.Query("items[*].conditions[?(@.type == 'Ready')].status").all(source) == ['True', 'False']
+    assert protobuf.Query('items[?(@.size > 1)].id').all(source) == ['b']
+    assert protobuf.Query('items[?(@.size)].id').all(source) == ['a', 'b']
+    assert protobuf.Query('items[?(@.id != "a")].id').all([source, source]) == ['b', 'c', 'b', 'c']
+    assert protobuf.Query('items[?(@.id > 1)].id').all(source) == []
+    assert protobuf.Query('items[-1].tags').all(source) == [{'x': 1, 'y': [2]}]
+    assert protobuf.Query('items[2].tags[*]').all(source) == [1, [2]]
+    assert protobuf.Query('items[0].missing').all(source) == []
+    assert protobuf.Query('items[0].missing').first(source, 'default') == 'default'
+    assert protobuf.Query('items[1]["id"]').first(source) == 'b'
+    assert protobuf.Query('items[0].id').all(protobuf.Unknown()) == []
+    with pytest.raises(TypeError):
+        protobuf.Query('id').all('text')
+
+
+def test_query_resources():
+    request = fnv1.RunFunctionRequest()
+    for ix in range(3):
+        request.required_resources['subnets'].items.add().resource.update({
+            'status': {'atProvider': {'id': f"subnet-{ix}"}},
+        })
+        request.observed.resources[f"resource-{ix}"].resource.update({
+            'status': {'conditions': [{'type': 'Ready', 'status': 'True' if ix else 'False'}]},
+        })
+        request.desired.resources[f"resource-{ix}"].resource.update({'kind': 'Bucket'})
+    request.desired.resources['resource-3'].resource.update({'kind': 'Bucket'})
+    composite_test = composite.BaseComposite(False, request, logging.getLogger(__name__))
+    subnets = protobuf.Query('status.atProvider.id')
+    assert subnets.all(composite_test.requireds.subnets) == ['subnet-0', 'subnet-1', 'subnet-2']
+    assert subnets.all(composite_test.requireds) == ['subnet-0', 'subnet-1', 'subnet-2']
+    assert subnets.all(composite_test.requireds.subnets[1]) == ['subnet-1']
+    assert subnets.all(composite_test.requireds.missing) == []
+    ready = protobuf.Query("status.conditions[?(@.type == 'Ready')].status")
+    assert ready.all(composite_test.resources) == ['False', 'True', 'True']
+    assert ready.all(composite_test.resources['resource-1']) == ['True']
+    for query in ('[0]', '*', "[?(@.type == 'Ready')]", 'status.conditions[0]', 'status.*'):
+        assert protobuf.Query(query).all(composite_test.resources['resource-3']) == []
+        assert protobuf.Query(query).all(composite_test.resources['resource-0'].observed.missing) == []
@@ -0,0 +1,45 @@
+
+import logging
+import os
+import pytest
+import time
+
+from crossplane.pythonic import function, synthetic
+
+# Larger compositions can be measured using, for example: PYTEST_SCALING_SIZES=1000,10000
+sizes = [int(size) for size in os.getenv('PYTEST_SCALING_SIZES', '10,100').split(',')]
+# Timings are only printed when requested, like the benchmarks: PYTEST_BENCHMARK=true
+benchmark = os.getenv('PYTEST_BENCHMARK', '').lower() == 'true'
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize('resources', sizes)
+@pytest.mark.parametrize('observed', (1.0, 0.5))
+async def test_scaling(resources, observed, capsys):
+    request = synthetic.request(resources, depth=5, requireds=3, schemas=2, context=10, observed=observed)
+    runner = function.FunctionRunner()
+    observations = []
+    runner.observe = lambda *observation: observations.append(observation)
+    logging.disable(logging.INFO)
+    try:
+        start = time.perf_counter()
+        response = await runner.RunFunction(request, None)
+        elapsed = time.perf_counter() - start
+    finally:
+        logging.disable(logging.NOTSET)
+
+    composite, step, result, phases = observations[0]
+    assert result == 'completed'
+    observed_count = int(resources * observed)
+    assert len(response.desired.resources) == min(observed_count + 1, resources)
+    if observed_count < resources:
+        assert response.results[0].reason == 'DesiredUnknowns'
+    else:
+        assert not response.results
+
+    if not benchmark:
+        return
+    with capsys.disabled():
+        print(f"\n{resources} resources, {observed:.0%} observed: {elapsed * 1000:.1f}ms", end='')
+        for phase, seconds in phases:
+            print(f", {phase} {seconds * 1000:.1f}ms", end='')